@@ -1,10 +1,11 @@
 """
-Downloads and stores as pickle the relevant EXIOBASE matrices
+Downloads and stores in the columnar MRIO store the relevant EXIOBASE matrices
 """
 
 import pymrio
 from pathlib import Path
-import pickle as pkl
+
+import mrio_store
 
 
 model_Path = Path(__file__).parent / 'mrio_models'
@@ -32,7 +33,7 @@ def process_exiobase(year_start=2012, year_end=2022, download=False):
         # ^^ df with gross total imports and exports per sector and region
         d['Bilateral Trade'] = trade[0]
         # ^^ df with rows: exporting country and sector, columns: importing countries
-        pkl.dump(d, open(resource_Path / f'exiobase_all_resources_{y}.pkl', 'wb'))
+        mrio_store.write_resources(d, resource_Path, 'exiobase', y)
 
 if __name__ == '__main__':
     process_exiobase(year_start = 2019, year_end=2019, download=True)
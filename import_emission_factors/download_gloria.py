@@ -1,11 +1,12 @@
 """
-Downloads and stores as pickle the relevant GLORIA matrices
+Downloads and stores in the columnar MRIO store the relevant GLORIA matrices
 """
 
 import pandas as pd
 
 from pathlib import Path
-import pickle as pkl
+
+import mrio_store
 
 # https://drive.google.com/drive/folders/1tm1Cs5ABVRuE3fDkT80TfE5fPmnWPrA7
 
@@ -45,7 +46,7 @@ def process_gloria(year_start=2012, year_end=2022, download=False):
         # ^^ df with gross total imports and exports per sector and region
         d['Bilateral Trade'] = trade[0]
         # ^^ df with rows: exporting country and sector, columns: importing countries
-        pkl.dump(d, open(resource_Path / f'gloria_all_resources_{y}.pkl', 'wb'))
+        mrio_store.write_resources(d, resource_Path, 'gloria', y)
 
 if __name__ == '__main__':
     process_gloria(year_start = 2022, year_end = 2022, download=True)
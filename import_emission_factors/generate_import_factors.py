@@ -1,28 +1,43 @@
 """
 Generates import factors from selected MRIO.
 Current options are: EXIOBASE, CEDA, GLORIA
+
+The factors are generated for a matrix of (source, year, schema) jobs, e.g.:
+
+    python generate_import_factors.py --sources gloria exiobase \
+        --years 2017 2018 --schemas 2012 2017 --workers 2
+
+The jobs of a (source, year) run together, so that the MRIO data of the year
+are loaded only once for all schemas.
 """
 
+import argparse
+import io
 import pickle as pkl
 import sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from functools import lru_cache
 from pathlib import Path
 
-import fedelemflowlist as fedelem
 import numpy as np
 import pandas as pd
 import yaml
-from esupy.dqi import get_weighted_average
 
 # add path to subfolder for importing modules
 path_proj = Path(__file__).parents[1]
 sys.path.append(str(path_proj / 'import_emission_factors'))  # accepts str, not pathlib obj
-from generate_import_shares import get_detail_to_summary_useeio_concordance, \
-    generate_import_shares
+import mrio_store
+import output_store
+import stage_cache
 
-#%% Set Parameters for import emission factors
+#%% Default parameters of the command line
 years = list(range(2017,2023)) # list
 schema = 2017 # int
+workers = 1 # number of (source, year) jobs processed concurrently
 source = 'gloria' # options are 'exiobase', 'ceda', 'gloria'
+mrio_cache_limit = 16e9 # bytes of processed MRIO resources kept in memory
 
 dataPath = Path(__file__).parent / 'data'
 conPath = Path(__file__).parent / 'concordances'
@@ -36,8 +51,14 @@ flow_cols = ('Flow', 'Compartment', 'Unit',
 
 #%%
 
-with open(dataPath / "mrio_config.yml", "r") as file:
-    config = yaml.safe_load(file)
+@lru_cache(maxsize=None)
+def get_config(source):
+    '''
+    Reads the MRIO config of the source. The config is shared by all callers
+    and must not be modified.
+    '''
+    with open(dataPath / "mrio_config.yml", "r") as file:
+        config = yaml.safe_load(file)
     config = config.get(source)
     if not config:
         raise IndexError(f'MRIO config not found for {source}')
@@ -46,129 +67,539 @@ with open(dataPath / "mrio_config.yml", "r") as file:
         flows = pd.read_csv(dataPath / config['mapping_file'])
         config['mapping_file'] = flows
         config['flows'] = dict(zip(flows['SourceFlowName'], flows['TargetFlowName']))
+    return config
 
 
-def generate_import_emission_factors(years: list, schema=2012, calc_tiva=False):
+class MRIOResourceCache:
+    '''
+    Loads the processed MRIO resources of a (source, year) only once and
+    shares them with all consumers. The matrices are read one by one from the
+    columnar store (see `mrio_store`), restricted to the requested stressors
+    or columns; if there is no store, the pickle
+    `{source}_all_resources_{year}.pkl` is loaded as a whole. The cached
+    resources must not be modified by the consumers. When a new
+    (source, year) is loaded, the least recently used entries are evicted
+    so that the estimated memory of the cache stays below `max_bytes`.
+    '''
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._sizes = {}
+
+    def get(self, mrio_source, year, name, **selection):
+        key = (mrio_source, year)
+        if key not in self._entries:
+            self._evict()
+            self._entries[key] = self._load(*key)
+        self._entries.move_to_end(key)
+        resources = self._entries[key]
+        if name not in resources:
+            resources[name] = mrio_store.read_resource(
+                resource_Path, key[0], year, name, **selection)
+        self._sizes[key] = sum(
+            df.memory_usage(deep=True).sum() if isinstance(df, pd.DataFrame)
+            else df.memory_usage(deep=True) for df in resources.values())
+        return resources[name]
+
+    def _load(self, mrio_source, year):
+        ensure_mrio_resources(year, mrio_source)
+        if mrio_store.has_store(resource_Path, mrio_source, year):
+            return {}
+        file = resource_Path / f'{mrio_source}_all_resources_{year}.pkl'
+        with open(file, 'rb') as f:
+            return pkl.load(f)
+
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+        # assume the new resources are as large as the last loaded ones
+        expected = list(self._sizes.values())[-1] if self._sizes else 0
+        while (self._entries and
+               sum(self._sizes.values()) + expected > self.max_bytes):
+            old, _ = self._entries.popitem(last=False)
+            del self._sizes[old]
+            print(f'Releasing {old[0]} data for {old[1]}')
+
+    def clear(self):
+        self._entries.clear()
+        self._sizes.clear()
+
+
+mrio_cache = MRIOResourceCache(max_bytes=mrio_cache_limit)
+
+
+def generate_import_emission_factors(years: list, schema=2012, calc_tiva=False,
+                                     workers=1, memory_budget=None,
+                                     source='gloria', refresh_eia=False):
     '''
     Runs through script to produce emission factors for U.S. imports from MRIO
+    for the given years (see `run_jobs`).
     '''
-    for year in years:
-        useeio_corr = get_detail_to_summary_useeio_concordance(schema=schema)
-        if not (out_Path / f'import_shares_{year}.csv').exists():
-            generate_import_shares(year, schema)
-        imports = pd.read_csv(out_Path / f'import_shares_{year}.csv')
-        imports = map_mrio_countires(imports)
-
-        ## Generate country specific emission factors by BEA sector weighted
-        ## by exports to US when sector mappings are not clean
-        mrio_to_useeio = get_mrio_to_useeio_concordance(schema=schema)
-        mrio_df = pull_mrio_multipliers(year)
-        bilateral = pull_mrio_data(year, opt = "bilateral")
-        output = pull_mrio_data(year, opt = "output")
-        export_field = list(config.get('exports').values())[0]
-
-        mrio_df = (
-            mrio_df.merge(bilateral, on=['CountryCode','MRIO Sector'], how='left')
-                   .merge(output, on=['CountryCode','MRIO Sector'], how='left')
-                   .merge(mrio_to_useeio, on='MRIO Sector', how='left')
-                   )
+    run_jobs([(source, year, schema) for year in years], calc_tiva=calc_tiva,
+             workers=workers, memory_budget=memory_budget,
+             refresh_eia=refresh_eia)
+
+
+def run_jobs(jobs, calc_tiva=False, workers=1, memory_budget=None,
+             refresh_eia=False):
+    '''
+    Produces the emission factors for U.S. imports for a list of
+    (source, year, schema) jobs. The jobs are grouped by (source, year), so
+    that the MRIO data of a year are loaded once for all its schemas. With
+    `workers` > 1, the groups are processed concurrently in a pool of worker
+    processes; `memory_budget` (in bytes) further limits the number of groups
+    that are processed at once (see `estimate_year_memory`). The messages of
+    each group are printed together, in the order of the jobs. The import
+    shares, which do not depend on the source, are prepared serially once
+    per (year, schema) before any job runs; the jobs only read them and
+    write the files of their own source, so that the output files are the
+    same as in the sequential mode. The import shares use the local copy of
+    the EIA workbook of the electricity imports, which is only downloaded
+    when it is missing; with `refresh_eia`, the current workbook is
+    downloaded first.
+    '''
+    if refresh_eia:
+        from generate_import_shares import download_electricity_imports
+
+        # the EIA workbook is not versioned; the import shares are
+        # regenerated when the downloaded one changed
+        download_electricity_imports()
+    for year, schema in dict.fromkeys((y, sch) for _, y, sch in jobs):
+        get_import_shares(year, schema)
+    groups = {}
+    for source, year, schema in jobs:
+        schemas = groups.setdefault((source, year), [])
+        if schema not in schemas:
+            schemas.append(schema)
+    if memory_budget is not None and len(groups) > 0:
+        per_year = max(estimate_year_memory(year, source)
+                       for source, year in groups)
+        if per_year > 0:
+            workers = min(workers, max(1, int(memory_budget // per_year)))
+    workers = max(1, min(workers, len(groups)))
+    if workers == 1:
+        for (source, year), schemas in groups.items():
+            for schema in schemas:
+                generate_import_emission_factors_for_year(
+                    year, schema, calc_tiva, source)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {key: pool.submit(_run_group, *key, schemas, calc_tiva)
+                   for key, schemas in groups.items()}
+        for (source, year), future in futures.items():
+            print(f'---- {source} {year} ----')
+            print(future.result(), end='')
+
+
+def _run_group(source, year, schemas, calc_tiva):
+    '''
+    Runs the schemas of a (source, year) in a worker process and returns the
+    printed messages.
+    '''
+    log = io.StringIO()
+    with redirect_stdout(log):
+        for schema in schemas:
+            generate_import_emission_factors_for_year(
+                year, schema, calc_tiva, source)
+    return log.getvalue()
+
+
+def estimate_year_memory(year, source):
+    '''
+    Estimates the peak memory (in bytes) of processing a year as a multiple
+    of the size of its processed MRIO resources on disk.
+    '''
+    store = mrio_store.store_path(resource_Path, source, year)
+    if store.is_dir():
+        size = sum(f.stat().st_size for f in store.iterdir())
+    else:
+        file = resource_Path / f'{source}_all_resources_{year}.pkl'
+        size = file.stat().st_size if file.exists() else 0
+    return 4 * size
+
+
+def generate_import_emission_factors_for_year(year, schema=2012, calc_tiva=False,
+                                              source='gloria'):
+    '''
+    Produces the emission factors for U.S. imports from MRIO for a year. The
+    import shares, the cleaned M matrix, the aggregated emission factors, and
+    the multiplier dataframe are cached stages (see `stage_cache` and
+    `get_stage_keys`); a stage is only computed when its inputs changed.
+    '''
+    keys = get_stage_keys(year, schema, source)
+    stage = f'multiplier_df_{source}_{year}_{str(schema)[-2:]}sch'
+    multiplier_df = stage_cache.load(stage, keys['multiplier_df'])
+    sectors = None
+    if multiplier_df is not None:
+        print(f'Using cached {stage}')
+    else:
+        patch = patch_multiplier_df(year, schema, source, keys)
+        if patch is None:
+            multiplier_df = calculate_multiplier_df(year, schema, source, keys)
+        else:
+            multiplier_df, sectors = patch
+        stage_cache.store(stage, keys['multiplier_df'], multiplier_df)
+    multiplier_df.to_csv(
+        out_Path /f'multiplier_df_{source}_{year}_{str(schema)[-2:]}sch.csv', index=False)
+    output_store.write_multipliers(multiplier_df, out_Path, source, year, schema)
+    calculate_and_store_emission_factors(multiplier_df, source, sectors)
+    stage_cache.store(
+        f'last_run_{source}_{year}_{str(schema)[-2:]}sch', keys['last_run'],
+        {'concordance': get_mrio_to_useeio_concordance(schema, source),
+         'aggregated_efs': keys['aggregated_efs'],
+         'multiplier_df': keys['multiplier_df']})
+    
+    # Optional: Recalculate using TiVA regions under original approach
+    if(calc_tiva):
+        t_c = calc_tiva_coefficients(year, schema=schema)
+        calculate_and_store_TiVA_approach(multiplier_df, t_c, year, source)
+
+
+def get_stage_keys(year, schema, source):
+    '''
+    Returns the keys of the cached stages of a year: the hashes of their
+    input files, config entries, and code, and of the keys of the stages
+    they use. Missing MRIO resources are processed first, so that the keys
+    cover their content.
+    '''
+    config = get_config(source)
+    ensure_mrio_resources(year, source)
+    code = stage_cache.code_version(
+        'generate_import_factors', 'mrio_store',
+        config['clean_M_function'].split('/')[0])
+    keys = {}
+    keys['import_shares'] = import_shares_key(year, schema)
+    keys['M'] = stage_cache.stage_key(
+        year, source, code, mrio_resource_hashes(year, source, 'M', 'output'),
+        {k: config.get(k) for k in (
+            'fields', 'flows', 'mapping_file', 'clean_M_function')})
+    # the Detail to Summary concordance is read by generate_import_shares
+    aggregation = stage_cache.stage_key(
+        keys['M'], schema, stage_cache.code_version('generate_import_shares'),
+        mrio_resource_hashes(year, source, 'Bilateral Trade', 'output'),
+        stage_cache.file_hash(conPath / 'useeio_internal_concordance.csv'),
+        {k: config.get(k) for k in (
+            'exports', 'output', 'calculation_configs', 'useeio_concordance',
+            'clean_trade_function')})
+    keys['aggregated_efs'] = stage_cache.stage_key(
+        aggregation, stage_cache.file_hash(
+            conPath / config.get('useeio_concordance').get('file')))
+    inputs = (
+        keys['import_shares'],
+        stage_cache.file_hash(conPath / f'{source}_country_concordance.csv'),
+        stage_cache.file_hash(dataPath / f'{source}_country_names.csv'),
+        {k: config.get(k) for k in (
+            'flows', 'mapping_file', 'currency_function',
+            'reference_currency', 'price_type')},
+        stage_cache.package_version('fedelemflowlist'),
+        stage_cache.package_version('CurrencyConverter'))
+    keys['multiplier_df'] = stage_cache.stage_key(
+        keys['aggregated_efs'], *inputs)
+    # all inputs but the MRIO to USEEIO concordance; the last run with the
+    # same inputs can be patched after a change of the concordance
+    keys['last_run'] = stage_cache.stage_key(aggregation, *inputs)
+    return keys
+
+
+def import_shares_key(year, schema):
+    '''
+    Returns the stage key of the import shares of a year and schema, which
+    are the same for all MRIO sources. It covers the API responses and the
+    EIA workbook of the electricity imports in the response_data folder.
+    '''
+    from generate_import_shares import eia_Path
+
+    responses = Path(__file__).parent / 'response_data'
+    return stage_cache.stage_key(
+        year, schema,
+        stage_cache.code_version('generate_import_shares',
+                                 'download_imports_data'),
+        [stage_cache.file_hash(f) for f in (
+            conPath / 'useeio_internal_concordance.csv',
+            conPath / 'country_to_region_concordance.csv',
+            conPath / 'Census_to_useeio2_sector_concordance.csv',
+            conPath / 'BEA_service_to_useeio2_sector_concordance.csv',
+            dataPath / 'BEA_country_names.csv',
+            dataPath / 'Census_country_codes.txt',
+            responses / f'census_responses_{year}.pkl',
+            responses / f'bea_responses_{year}.pkl',
+            eia_Path)])
+
+
+def get_import_shares(year, schema):
+    '''
+    Returns the import shares of a year and schema from the stage cache, or
+    generates them and writes the `import_shares_{year}_{sch}sch.csv` file.
+    The result is stored with the key of its inputs after the generation,
+    as the API responses are only downloaded by the first run.
+    '''
+    from generate_import_shares import generate_import_shares
+
+    shares_file = out_Path / f'import_shares_{year}_{str(schema)[-2:]}sch.csv'
+    imports = stage_cache.load(shares_file.stem, import_shares_key(year, schema))
+    if imports is not None:
+        print(f'Using cached {shares_file.stem}')
+        return imports
+    generate_import_shares(year, schema)
+    imports = pd.read_csv(shares_file)
+    stage_cache.store(shares_file.stem, import_shares_key(year, schema), imports)
+    return imports
 
-        if config.get('calculation_configs')\
-            .get('use_industry_output_for_usa_electricity_imports'):
-            # Perform adjustment for electricity which is not well characterized by
-            # export data
-            mrio_df[export_field] = np.where(mrio_df['BEA Detail'].str.startswith('221100'),
-                                            mrio_df['Output'], mrio_df[export_field])
-
-        # to maintain US data, use industry output as the export field for US
-        mrio_df[export_field] = np.where(mrio_df['CountryCode'] == "US",
-                                         mrio_df['Output'], mrio_df[export_field])
-
-        # INSERT HERE TO REVIEW MRIO SECTOR CONTRIBUTIONS WITHIN A COUNTRY
-        # Weight MRIO sectors within BEA sectors according to trade
-        mrio_df = mrio_df.drop(columns=['MRIO Sector','Year'])
-        agg_cols = ['BEA Detail', 'CountryCode', 'BaseIOSchema']
-        cols = [c for c in mrio_df.columns if c not in ([export_field] + agg_cols)]
-        agg_dict = {col: 'mean' if col in cols else 'sum'
-                    for col in cols + [export_field]}
-        agg = mrio_df.groupby(agg_cols).agg(agg_dict)
-        # Don't lose countries with no US exports in MRIO, as these countries
-        # may have exports according to US data, collapse them using straight mean
-        agg2 = agg.query(f'`{export_field}` == 0')
-        agg = agg.query(f'`{export_field}` > 0')
-        for c in cols:
-            agg[c] = get_weighted_average(mrio_df.query(f'`{export_field}` > 0'),
-                                          c, export_field, agg_cols)
-        agg = (pd.concat([agg, agg2], ignore_index=False)
-               .reset_index()
-               .sort_values(by=['BEA Detail', 'CountryCode'])
-               .merge(useeio_corr, how='left', on='BEA Detail')
+
+def patch_multiplier_df(year, schema, source, keys):
+    '''
+    Patches the multiplier dataframe of the last run when only the MRIO to
+    USEEIO concordance changed since then: the aggregated emission factors
+    and the multipliers are recalculated only for the BEA Detail sectors
+    whose mappings changed. Returns the multiplier dataframe and the changed
+    sectors by level, or None when there is no such run.
+    '''
+    sch = f'{str(schema)[-2:]}sch'
+    last = stage_cache.load(f'last_run_{source}_{year}_{sch}', keys['last_run'])
+    if last is None:
+        return None
+    agg = stage_cache.load(f'aggregated_efs_{source}_{year}_{sch}',
+                           last['aggregated_efs'])
+    multiplier_df = stage_cache.load(f'multiplier_df_{source}_{year}_{sch}',
+                                     last['multiplier_df'])
+    if agg is None or multiplier_df is None:
+        return None
+
+    mrio_to_useeio = get_mrio_to_useeio_concordance(schema, source)
+    diff = last['concordance'].merge(mrio_to_useeio, how='outer',
+                                     indicator=True)
+    detail = set(diff.query('_merge != "both"')['BEA Detail'].dropna())
+    print(f'Recalculating sectors with changed mappings: {sorted(detail)}')
+
+    agg = pd.concat(
+        [agg[~agg['BEA Detail'].isin(detail)],
+         calculate_aggregated_efs(year, schema, source, keys, detail)],
+        ignore_index=True)
+    agg = (agg.sort_values(by=['BEA Detail', 'CountryCode'])
+              .reset_index(drop=True))
+    stage_cache.store(f'aggregated_efs_{source}_{year}_{sch}',
+                      keys['aggregated_efs'], agg)
+
+    patched = calculate_multiplier_df(year, schema, source, keys, detail)
+    summary = set(multiplier_df.loc[multiplier_df['BEA Detail'].isin(detail),
+                                    'BEA Summary'].dropna())
+    summary |= set(patched['BEA Summary'].dropna())
+    # keep the order of the full calculation: by flow, then by the rows of
+    # the aggregated emission factors
+    flow_order = {f: i for i, f in enumerate(pd.unique(pd.concat(
+        [multiplier_df['Flowable'], patched['Flowable']])))}
+    multiplier_df = pd.concat(
+        [multiplier_df[~multiplier_df['BEA Detail'].isin(detail)], patched],
+        ignore_index=True)
+    multiplier_df = (multiplier_df
+                     .assign(order=multiplier_df['Flowable'].map(flow_order))
+                     .sort_values(by=['order', 'BEA Detail', 'CountryCode'],
+                                  kind='stable')
+                     .drop(columns='order')
+                     .reset_index(drop=True))
+    check_contributions(multiplier_df)
+    return multiplier_df, {'Detail': detail, 'Summary': summary}
+
+
+def calculate_multiplier_df(year, schema, source, keys, sectors=None):
+    '''
+    Combines the aggregated emission factors by country and BEA sector with
+    the import shares of the countries. With `sectors`, only the multipliers
+    of these BEA Detail sectors are calculated.
+    '''
+    imports = map_mrio_countires(get_import_shares(year, schema), source)
+    if sectors is None:
+        agg = stage_cache.cached(
+            f'aggregated_efs_{source}_{year}_{str(schema)[-2:]}sch',
+            keys['aggregated_efs'],
+            lambda: calculate_aggregated_efs(year, schema, source, keys))
+    else:
+        agg = stage_cache.load(
+            f'aggregated_efs_{source}_{year}_{str(schema)[-2:]}sch',
+            keys['aggregated_efs'])
+        agg = agg[agg['BEA Detail'].isin(sectors)].reset_index(drop=True)
+        imports = imports[imports['BEA Detail'].isin(sectors)]
+    export_field = list(get_config(source).get('exports').values())[0]
+
+    ## Combine EFs with contributions by country
+    # Aggregate imports data by MRIO country code
+    imports_agg = (
+        imports.groupby(
+            [c for c in imports if c not in (
+                'Country', 'Import Quantity', 'cntry_cntrb_to_region_summary',
+                'cntry_cntrb_to_region_detail', 'cntry_cntrb_to_national_summary',
+                'cntry_cntrb_to_national_detail')])
+                .agg({'Import Quantity': sum,
+                      'cntry_cntrb_to_region_summary': sum,
+                      'cntry_cntrb_to_region_detail': sum,
+                      'cntry_cntrb_to_national_summary': sum,
+                      'cntry_cntrb_to_national_detail': sum})
+                .reset_index()
+                )
+    mrio_country_names = pd.read_csv(dataPath / f'{source}_country_names.csv')
+    multiplier_df = (agg.reset_index(drop=True).drop(columns=export_field)
+                        .merge(imports_agg.drop(columns=['Unit']),
+                               how='left',
+                               on=['CountryCode', 'BEA Detail', 'BEA Summary'])
+                        .merge(mrio_country_names, on='CountryCode', validate='m:1')
+                        )
+    missing = set(imports_agg['CountryCode']) - set(agg['CountryCode'])
+    if(len(missing) > 0):
+        print(f'WARNING: missing countries in correspondence: {missing}')
+
+    # Check for sectors missing from MRIO mapping file
+    check = pd.concat([
+        imports_agg.query('cntry_cntrb_to_national_detail > 0')[['BEA Summary', 'BEA Detail']].drop_duplicates().assign(source='imports'),
+        agg[['BEA Summary', 'BEA Detail']].drop_duplicates().assign(source='mrio')],
+        ignore_index=True)
+    duplicates = check.duplicated(keep=False, subset=['BEA Summary', 'BEA Detail'])
+    check_unique = check[~duplicates]
+    missing = check_unique.query('source == "imports"').sort_values(by='BEA Summary')
+    if(len(missing) > 0):
+        print(f'WARNING: sectors with imports not found in MRIO: \n',
+              f'{missing.drop(columns="source").to_string(index=False)}')
+
+    ## NOTE: If in future more physical data are brought in, the code 
+    ##       is unable to distinguish and sort out mismatches by detail/
+    ##       summary sectors.
+    multiplier_df = df_prepare(multiplier_df, year, source)
+    if sectors is None:
+        check_contributions(multiplier_df)
+    return multiplier_df
+
+
+def check_contributions(multiplier_df):
+    check = (multiplier_df
+             .query('Flow == @multiplier_df["Flow"][0]')
+             .groupby(['BEA Summary']).agg({'cntry_cntrb_to_national_summary':'sum'})
+             .rename(columns={'cntry_cntrb_to_national_summary': 'contrib'})
+             .query('contrib > 0 and contrib <= 0.9999')
+             )
+    if(len(check) > 0):
+        print(f'WARNING: some sectors may have missing data: \n'
+              f'{check.to_string(index=True)}')
+
+
+def calculate_aggregated_efs(year, schema, source, keys, sectors=None):
+    '''
+    Generates country specific emission factors by BEA sector, weighted by
+    exports to US when sector mappings are not clean. With `sectors`, only
+    the emission factors of these BEA Detail sectors are generated.
+    '''
+    from generate_import_shares import get_detail_to_summary_useeio_concordance
+
+    config = get_config(source)
+    useeio_corr = get_detail_to_summary_useeio_concordance(schema=schema)
+    mrio_to_useeio = get_mrio_to_useeio_concordance(schema=schema, source=source)
+    if sectors is not None:
+        mrio_to_useeio = mrio_to_useeio[mrio_to_useeio['BEA Detail'].isin(sectors)]
+    mrio_df = stage_cache.cached(
+        f'M_{source}_{year}', keys['M'],
+        lambda: pull_mrio_multipliers(year, source))
+    bilateral = pull_mrio_data(year, opt = "bilateral", source = source)
+    output = pull_mrio_data(year, opt = "output", source = source)
+    export_field = list(config.get('exports').values())[0]
+
+    mrio_df = (
+        mrio_df.merge(bilateral, on=['CountryCode','MRIO Sector'], how='left')
+               .merge(output, on=['CountryCode','MRIO Sector'], how='left')
                )
-        ## ^^ MRIO Emission Factors by USEEIO Detail in MRIO currency
-
-        ## Combine EFs with contributions by country
-        # Aggregate imports data by MRIO country code
-        imports_agg = (
-            imports.groupby(
-                [c for c in imports if c not in (
-                    'Country', 'Import Quantity', 'cntry_cntrb_to_region_summary',
-                    'cntry_cntrb_to_region_detail', 'cntry_cntrb_to_national_summary',
-                    'cntry_cntrb_to_national_detail')])
-                    .agg({'Import Quantity': sum,
-                          'cntry_cntrb_to_region_summary': sum,
-                          'cntry_cntrb_to_region_detail': sum,
-                          'cntry_cntrb_to_national_summary': sum,
-                          'cntry_cntrb_to_national_detail': sum})
-                    .reset_index()
-                    )
-        mrio_country_names = pd.read_csv(dataPath / f'{source}_country_names.csv')
-        multiplier_df = (agg.reset_index(drop=True).drop(columns=export_field)
-                            .merge(imports_agg.drop(columns=['Unit']),
-                                   how='left',
-                                   on=['CountryCode', 'BEA Detail', 'BEA Summary'])
-                            .merge(mrio_country_names, on='CountryCode', validate='m:1')
-                            )
-        missing = set(imports_agg['CountryCode']) - set(agg['CountryCode'])
-        if(len(missing) > 0):
-            print(f'WARNING: missing countries in correspondence: {missing}')
-
-        # Check for sectors missing from MRIO mapping file
-        check = pd.concat([
-            imports_agg.query('cntry_cntrb_to_national_detail > 0')[['BEA Summary', 'BEA Detail']].drop_duplicates().assign(source='imports'),
-            agg[['BEA Summary', 'BEA Detail']].drop_duplicates().assign(source='mrio')],
-            ignore_index=True)
-        duplicates = check.duplicated(keep=False, subset=['BEA Summary', 'BEA Detail'])
-        check_unique = check[~duplicates]
-        missing = check_unique.query('source == "imports"').sort_values(by='BEA Summary')
-        if(len(missing) > 0):
-            print(f'WARNING: sectors with imports not found in MRIO: \n',
-                  f'{missing.drop(columns="source").to_string(index=False)}')
-
-        ## NOTE: If in future more physical data are brought in, the code 
-        ##       is unable to distinguish and sort out mismatches by detail/
-        ##       summary sectors.
-        multiplier_df = df_prepare(multiplier_df, year)
-        check = (multiplier_df
-                 .query('Flow == @multiplier_df["Flow"][0]')
-                 .groupby(['BEA Summary']).agg({'cntry_cntrb_to_national_summary':'sum'})
-                 .rename(columns={'cntry_cntrb_to_national_summary': 'contrib'})
-                 .query('contrib > 0 and contrib <= 0.9999')
-                 )
-        if(len(check) > 0):
-            print(f'WARNING: some sectors may have missing data: \n'
-                  f'{check.to_string(index=True)}')
-        multiplier_df.to_csv(
-            out_Path /f'multiplier_df_{source}_{year}_{str(schema)[-2:]}sch.csv', index=False)
-        calculate_and_store_emission_factors(multiplier_df)
-        
-        # Optional: Recalculate using TiVA regions under original approach
-        if(calc_tiva):
-            t_c = calc_tiva_coefficients(year, schema=schema)
-            calculate_and_store_TiVA_approach(multiplier_df, t_c, year)
+
+    # INSERT HERE TO REVIEW MRIO SECTOR CONTRIBUTIONS WITHIN A COUNTRY
+    # Weight MRIO sectors within BEA sectors according to trade
+    agg, agg2 = aggregate_mrio_to_bea(
+        mrio_df, mrio_to_useeio, export_field,
+        use_output_for_electricity=config.get('calculation_configs')
+            .get('use_industry_output_for_usa_electricity_imports'))
+    agg = (pd.concat([agg, agg2], ignore_index=False)
+           .reset_index()
+           .sort_values(by=['BEA Detail', 'CountryCode'])
+           .merge(useeio_corr, how='left', on='BEA Detail')
+           )
+    ## ^^ MRIO Emission Factors by USEEIO Detail in MRIO currency
+    return agg
+
+
+def aggregate_mrio_to_bea(mrio_df, mrio_to_useeio, export_field,
+                          use_output_for_electricity=False):
+    '''
+    Aggregates the (country, MRIO sector) rows of mrio_df to
+    (BEA Detail, CountryCode, BaseIOSchema) groups of the MRIO to USEEIO
+    concordance. The concordance is compiled into sparse matrices from the
+    rows to the groups, so that the data columns are never expanded to one
+    row per matching BEA sector. The weight of a row in a group is the export
+    to the U.S.; the industry output is used for the U.S. and, optionally,
+    for electricity (BEA 221100), which is not well characterized by export
+    data. Returns the groups with exports, with the export-weighted means of
+    the data columns (see `get_weighted_averages`), and the groups without
+    exports, with the straight means; both with the summed exports.
+    '''
+    from scipy import sparse
+
+    rows = mrio_df.reset_index(drop=True)
+    agg_cols = ['BEA Detail', 'CountryCode', 'BaseIOSchema']
+    cols = [c for c in rows.columns if c not in
+            ([export_field] + agg_cols + ['MRIO Sector', 'Year'])]
+
+    # the (row, BEA Detail) pairs of the concordance and their groups
+    pairs = (rows[['CountryCode', 'MRIO Sector']]
+             .assign(row=rows.index)
+             .merge(mrio_to_useeio, on='MRIO Sector')
+             .dropna(subset=agg_cols))
+    group_of, groups = pd.MultiIndex.from_frame(pairs[agg_cols]).factorize(sort=True)
+    groups.names = agg_cols
+    r = pairs['row'].to_numpy()
+    shape = (len(groups), len(rows))
+
+    weight = rows[export_field].to_numpy(dtype=float)[r]
+    output = rows['Output'].to_numpy(dtype=float)[r]
+    use_output = (pairs['CountryCode'] == "US").to_numpy(copy=True)
+    if use_output_for_electricity:
+        use_output |= pairs['BEA Detail'].str.startswith('221100').to_numpy(dtype=bool)
+    weight = np.where(use_output, output, weight)
+
+    X = rows[cols].to_numpy(dtype=float)
+
+    # straight means and summed exports
+    K = sparse.csr_matrix((np.ones(len(r)), (group_of, r)), shape=shape)
+    means = get_weighted_averages(X, K, empty=np.nan)
+    exports = np.bincount(group_of, weights=np.nan_to_num(weight, nan=0.0),
+                          minlength=len(groups))
+    agg = pd.DataFrame(means, index=groups, columns=cols)
+    agg[export_field] = exports
+
+    # export-weighted means over the pairs with exports
+    pos = weight > 0
+    G = sparse.csr_matrix((weight[pos], (group_of[pos], r[pos])), shape=shape)
+    weighted = get_weighted_averages(X, G)
+
+    # Don't lose countries with no US exports in MRIO, as these countries
+    # may have exports according to US data, collapse them using straight mean
+    agg2 = agg[exports == 0]
+    agg = agg[exports > 0].copy()
+    agg[cols] = weighted[exports > 0]
+    return agg, agg2
+
+
+def get_weighted_averages(X, W, empty=0.0):
+    '''
+    Calculates the weighted averages of all columns of the data array X
+    (rows by columns, NaN for missing values) for the groups of the weight
+    matrix W (groups by rows, e.g. a sparse matrix), with one product for
+    all columns. Like `esupy.dqi.get_weighted_average` per column, missing
+    values are excluded from both sums; groups without weight get `empty`.
+    '''
+    notnull = ~np.isnan(X)
+    dw = W @ np.where(notnull, X, 0.0)
+    wn = W @ notnull.astype(float)
+    return np.divide(dw, wn, out=np.full(dw.shape, float(empty)),
+                     where=wn != 0)
 
 
-def df_prepare(df, year):
+def df_prepare(df, year, source):
     "melt dataframe, add metadata, convert to fedefl and apply currency exchange"
+    config = get_config(source)
     df = df.melt(
         id_vars = [c for c in df if c not in 
                    config['flows'].values()],
@@ -198,6 +629,7 @@ def df_prepare(df, year):
             .assign(Compartment='emission/air')
             .assign(Unit='kg')
             )
+        import fedelemflowlist as fedelem
         fl = (fedelem.get_flows()
               .query('Flowable in @df.Flow')
               .filter(['Flowable', 'Context', 'Flow UUID'])
@@ -220,7 +652,7 @@ def df_prepare(df, year):
         .assign(PriceType=config['price_type'])
         )
 
-    df = adjust_currency_and_rename_flows_units(df, year)
+    df = adjust_currency_and_rename_flows_units(df, year, source)
 
     return df
 
@@ -259,9 +691,9 @@ def get_tiva_data(year):
     return ri_df
     
 
-def adjust_currency_and_rename_flows_units(df, year):
-    if 'currency_function' in config:
-        fxn = extract_function_from_config('currency_function')
+def adjust_currency_and_rename_flows_units(df, year, source):
+    if 'currency_function' in get_config(source):
+        fxn = extract_function_from_config('currency_function', source)
         df = fxn(df, year)
 
     df.loc[df['Flowable'] == 'HFCs and PFCs, unspecified',
@@ -307,10 +739,16 @@ def calc_tiva_coefficients(year, level='Summary', schema=2012):
     return t_c
 
 
-def get_mrio_to_useeio_concordance(schema=2012):
+def get_mrio_to_useeio_concordance(schema=2012, source='gloria'):
     '''
     Opens MRIO to USEEIO binary concordance.
     '''
+    return _read_mrio_to_useeio_concordance(schema, source).copy()
+
+
+@lru_cache(maxsize=None)
+def _read_mrio_to_useeio_concordance(schema, source):
+    config = get_config(source)
     path = conPath / config.get('useeio_concordance').get('file')
     fields = config.get('useeio_concordance').get('fields')
     fields = {k.replace('__schema__', str(schema)): v for k,v in fields.items()}
@@ -323,7 +761,7 @@ def get_mrio_to_useeio_concordance(schema=2012):
     return e_u
 
 
-def map_mrio_countires(df):
+def map_mrio_countires(df, source):
     path = conPath / f'{source}_country_concordance.csv'
     codes = pd.read_csv(path, dtype=str, usecols=['Country', 'CountryCode'])
     df = df.merge(codes, on='Country', how='left', validate='m:1')
@@ -334,18 +772,15 @@ def map_mrio_countires(df):
     return df.dropna(subset='CountryCode').reset_index(drop=True)
 
 
-def pull_mrio_multipliers(year):
+def pull_mrio_multipliers(year, source):
     '''
     Extracts multiplier matrix from stored MRIO model.
     '''
-    file = resource_Path / f'{source}_all_resources_{year}.pkl'
-    if not file.exists():
-        print(f"{source} data not found for {year}")
-        process_mrio_data(year)
-    mrio = pkl.load(open(file,'rb'))
+    config = get_config(source)
+    M = mrio_cache.get(source, year, 'M', stressors=list(config['flows'].keys()))
 
     fields_to_rename = {**config['fields'], **config['flows']}
-    M_df = clean_mrio_M_matrix(mrio['M'], fields_to_rename, year)
+    M_df = clean_mrio_M_matrix(M, fields_to_rename, year, source)
     M_df = M_df.assign(Year=str(year))
 
     # # for impacts
@@ -356,23 +791,21 @@ def pull_mrio_multipliers(year):
     return M_df
 
 
-def pull_mrio_data(year, opt):
+def pull_mrio_data(year, opt, source):
     '''
     Extracts bilateral trade data (opt = "bilateral") by industry from
     countries to the U.S. or industry output (opt = "output")
     from stored MRIO model.
     '''
-    file = resource_Path / f'{source}_all_resources_{year}.pkl'
-    if not file.exists():
-        print(f"{source} data not found for {year}")
-        process_mrio_data(year)
-    mrio = pkl.load(open(file,'rb'))
+    config = get_config(source)
     fields = {**config['fields'], **config['exports'], **config['output']}
     if opt == "bilateral":
-        df = mrio['Bilateral Trade']
-        df = (clean_mrio_trade_data(df).rename(columns=fields))
+        # only the exports to the U.S. are used
+        df = mrio_cache.get(source, year, 'Bilateral Trade',
+                            columns=list(config['exports'].keys()))
+        df = (clean_mrio_trade_data(df, source).rename(columns=fields))
     elif opt == "output":
-        df = mrio['output']
+        df = mrio_cache.get(source, year, 'output')
         df = (df
               .reset_index()
               .rename(columns=fields)
@@ -380,37 +813,65 @@ def pull_mrio_data(year, opt):
     return df
 
 
-def process_mrio_data(year):
+def ensure_mrio_resources(year, source):
+    '''
+    Processes the MRIO data of a year if there are no processed resources.
+    '''
+    if (mrio_store.has_store(resource_Path, source, year) or
+            (resource_Path / f'{source}_all_resources_{year}.pkl').exists()):
+        return
+    print(f"{source} data not found for {year}")
+    process_mrio_data(year, source)
+
+
+def mrio_resource_hashes(year, source, *names):
+    '''
+    Returns the content hashes of the given processed MRIO resources of a
+    year, or of the pickle with all resources when there is no store.
+    '''
+    if mrio_store.has_store(resource_Path, source, year):
+        return [stage_cache.file_hash(
+            mrio_store.matrix_file(resource_Path, source, year, name))
+            for name in names]
+    return stage_cache.file_hash(
+        resource_Path / f'{source}_all_resources_{year}.pkl')
+
+
+def process_mrio_data(year, source):
     '''
     Wrapper function to call correct MRIO processing function
     '''
-    fxn = extract_function_from_config('process_function')
+    fxn = extract_function_from_config('process_function', source)
     fxn(year_start=year, year_end=year)
 
 
-def clean_mrio_M_matrix(M, fields_to_rename, year):
+def clean_mrio_M_matrix(M, fields_to_rename, year, source):
     '''
     Wrapper function to call correct M matrix cleaning function for MRIO
     '''
-    fxn = extract_function_from_config('clean_M_function')
-    return fxn(M, fields_to_rename, mapping=config.get('mapping_file'), year=year)
+    fxn = extract_function_from_config('clean_M_function', source)
+    return fxn(M, fields_to_rename,
+               mapping=get_config(source).get('mapping_file'), year=year,
+               output=pull_mrio_data(year, 'output', source))
 
 
-def clean_mrio_trade_data(df):
+def clean_mrio_trade_data(df, source):
     '''
     Wrapper function to correctly clean the MRIO bilateral trade data
     '''
-    if 'clean_trade_function' in config:
-        fxn = extract_function_from_config('clean_trade_function')
+    if 'clean_trade_function' in get_config(source):
+        fxn = extract_function_from_config('clean_trade_function', source)
         return fxn(df)
     else:
         return df
 
 
-def calculate_and_store_emission_factors(multiplier_df):
+def calculate_and_store_emission_factors(multiplier_df, source, sectors=None):
     '''
     Calculates and saves import factors by region and aggregated to national
-    totals.
+    totals, as CSV files and in the factor dataset of `output_store`. With
+    `sectors` (by level, e.g. {'Detail': {'221100'}}), only the factors of
+    these sectors are recalculated and patched into existing files.
     '''
     schema = str(int(multiplier_df['BaseIOSchema'][0]))
     cols = [c for c in multiplier_df if c in flow_cols]
@@ -422,9 +883,15 @@ def calculate_and_store_emission_factors(multiplier_df):
                  'cntry_cntrb_to_national_summary': 'Summary'}.items():
         r = 'nation' if 'national' in k else 'subregion'
         c =  'CountryCode' if 'national' in k else 'Region'
-        agg_df = (multiplier_df
+        file = (out_Path / f'US_{v.lower()}_import_factors_{source}_{year}_{schema[-2:]}sch.csv'
+                if r == 'nation' else
+                out_Path / f'Regional_{v.lower()}_import_factors_{source}_{year}_{schema[-2:]}sch.csv')
+        patch = sectors is not None and file.exists()
+        df = (multiplier_df[multiplier_df[f'BEA {v}'].isin(sectors[v])]
+              if patch else multiplier_df)
+        agg_df = (df
                   .dropna(subset='Import Quantity')
-                  .assign(FlowAmount = (multiplier_df['EF'] * multiplier_df[k])))
+                  .assign(FlowAmount = (df['EF'] * df[k])))
         agg_df = (agg_df
                   .rename(columns={f'BEA {v}': 'Sector'})
                   .groupby([c, 'Sector'] + cols)
@@ -438,17 +905,31 @@ def calculate_and_store_emission_factors(multiplier_df):
                       .agg({'FlowAmount': sum})
                       .assign(BaseIOLevel=v)
                       .reset_index())
-            agg_df.to_csv(
-                out_Path / f'US_{v.lower()}_import_factors_{source}_{year}_{schema[-2:]}sch.csv',
-                index=False)
-        elif r == 'subregion':
-            agg_df.to_csv(
-                out_Path / f'Regional_{v.lower()}_import_factors_{source}_{year}_{schema[-2:]}sch.csv',
-                index=False)
+        if patch:
+            agg_df = patch_factors(file, agg_df, sectors[v])
+        agg_df.to_csv(file, index=False)
+        output_store.write_factors(agg_df, out_Path,
+                                   'US' if r == 'nation' else 'Regional',
+                                   source, year, schema, v)
+
+
+def patch_factors(file, agg_df, sectors):
+    '''
+    Replaces the factors of the given sectors in a stored factor file with
+    the recalculated factors in agg_df, in the order of a full calculation.
+    '''
+    keys = [c for c in agg_df if c not in ('FlowAmount', 'BaseIOLevel')]
+    stored = pd.read_csv(file, dtype={c: str for c in agg_df
+                                      if c != 'FlowAmount'},
+                         float_precision='round_trip')
+    return (pd.concat([stored[~stored['Sector'].isin(sectors)], agg_df],
+                      ignore_index=True)
+              .sort_values(by=keys)
+              .reset_index(drop=True))
 
 
 def calculate_and_store_TiVA_approach(multiplier_df,
-                                      import_contribution_coeffs, year):
+                                      import_contribution_coeffs, year, source):
     '''
     Merges import contribution coefficients with weighted MRIO 
     multiplier dataframe. Import coefficients are then multiplied by the 
@@ -456,6 +937,7 @@ def calculate_and_store_TiVA_approach(multiplier_df,
     incorporate TiVA imports by region.
     '''
     schema = str(int(multiplier_df['BaseIOSchema'][0]))
+    suffix = f'{source}_{year}_{schema[-2:]}sch'
     weighted_df_imports = (
         multiplier_df
         .merge(import_contribution_coeffs, how='left', validate='m:1',
@@ -492,13 +974,13 @@ def calculate_and_store_TiVA_approach(multiplier_df,
         .query('~(cntry_cntrb_to_national_summary == 0 and '
                '`cntry_cntrb_to_national_summary TiVA` == 0)'))
     contribution_comparison.to_csv(
-        out_Path / f'import_shares_comparison_detail_{year}.csv')
+        out_Path / f'import_shares_comparison_detail_{suffix}.csv')
 
     summary = (contribution_comparison
                .groupby(['BEA Summary', 'Year'])
                .agg({'Tiva_minus_SID': ['mean', 'min', 'max']})
                )
-    summary.to_csv(out_Path / f'import_shares_comparison_{year}.csv')
+    summary.to_csv(out_Path / f'import_shares_comparison_{suffix}.csv')
         
     weighted_df_imports_td = weighted_df_imports.rename(columns={'FlowAmount_Detail':'FlowAmount'})
     weighted_df_imports_ts = weighted_df_imports.rename(columns={'FlowAmount_Summary':'FlowAmount'})
@@ -532,10 +1014,14 @@ def calculate_and_store_TiVA_approach(multiplier_df,
     imports_multipliers_td.to_csv(
         out_Path / f'US_detail_import_factors_TiVA_approach_{source}_{year}_{schema[-2:]}sch.csv',
         index=False)
+    for df, level in ((imports_multipliers_ts, 'Summary'),
+                      (imports_multipliers_td, 'Detail')):
+        output_store.write_factors(df, out_Path, 'US_TiVA_approach', source,
+                                   year, schema, level)
 
 
-def extract_function_from_config(fkey):
-    source_fxn = config.get(fkey).split('/')
+def extract_function_from_config(fkey, source):
+    source_fxn = get_config(source).get(fkey).split('/')
     try:
         module = __import__(source_fxn[0])
     except ModuleNotFoundError:
@@ -553,6 +1039,32 @@ def extract_function_from_config(fkey):
 
 #%%
 if __name__ == '__main__':
-    generate_import_emission_factors(years = years, schema = schema)
+    parser = argparse.ArgumentParser(
+        description='Generates import emission factors from MRIO models for '
+                    'all combinations of the given sources, years, and '
+                    'schemas')
+    parser.add_argument('--sources', nargs='+', default=[source],
+                        help='the MRIO sources: exiobase, ceda, gloria')
+    parser.add_argument('--years', nargs='+', type=int, default=years)
+    parser.add_argument('--schemas', nargs='+', type=int, default=[schema],
+                        help='the BEA schema years, e.g. 2012 2017')
+    parser.add_argument('--workers', type=int, default=workers,
+                        help='the number of (source, year) jobs processed '
+                             'concurrently')
+    parser.add_argument('--memory-budget', type=float, default=None,
+                        help='limits the concurrent jobs by their estimated '
+                             'memory, in bytes')
+    parser.add_argument('--tiva', action='store_true',
+                        help='also calculate the factors with the TiVA '
+                             'approach')
+    parser.add_argument('--refresh-eia', action='store_true',
+                        help='download the current EIA workbook of the '
+                             'electricity imports instead of using the '
+                             'local copy')
+    args = parser.parse_args()
+    run_jobs([(s, y, sch) for s in args.sources for y in args.years
+              for sch in args.schemas],
+             calc_tiva=args.tiva, workers=args.workers,
+             memory_budget=args.memory_budget, refresh_eia=args.refresh_eia)
     # multiplier_df = (pd.read_csv(out_Path /f'multiplier_df_{source}_2022_{str(schema)[-2:]}sch.csv')
     #                   .query('Flow == "Carbon dioxide"'))
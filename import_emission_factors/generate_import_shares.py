@@ -2,13 +2,17 @@
 Generates import shares (fractions of imports by commodity and country)
 """
 
+import os
 from pathlib import Path
 import pandas as pd
+import requests
 
 from download_imports_data import get_imports_data
 
 conPath = Path(__file__).parent / 'concordances'
 out_Path = Path(__file__).parent / 'output'
+eia_url = 'https://www.eia.gov/electricity/annual/xls/epa_02_14.xlsx'
+eia_Path = Path(__file__).parent / 'response_data' / 'epa_02_14.xlsx'
 
 single_country_regions = ('CA', 'MX', 'JP', 'CN')
 
@@ -28,7 +32,8 @@ def generate_import_shares(year, schema):
     imports = map_countries_to_regions(imports)
     imports = calc_contribution_coefficients(imports, schema=schema)
     ## ^^ Country contribution coefficients by sector
-    imports.to_csv(out_Path / f'import_shares_{year}.csv', index=False)
+    imports.to_csv(out_Path / f'import_shares_{year}_{str(schema)[-2:]}sch.csv',
+                   index=False)
 
 
 def get_detail_to_summary_useeio_concordance(schema=2012):
@@ -47,11 +52,36 @@ def get_detail_to_summary_useeio_concordance(schema=2012):
     return u_c
 
 
+def download_electricity_imports():
+    '''
+    Downloads the current EIA workbook of the electricity trade with Canada
+    and Mexico to the response_data folder; the file is only replaced when
+    its content changed. When the download fails, the copy of an earlier
+    download is used.
+    '''
+    try:
+        response = requests.get(eia_url, timeout=60)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        if not eia_Path.exists():
+            raise
+        print(f'WARNING: EIA electricity imports not downloaded, using the '
+              f'local copy: {e}')
+        return
+    if eia_Path.exists() and eia_Path.read_bytes() == response.content:
+        return
+    eia_Path.parent.mkdir(exist_ok=True)
+    tmp = eia_Path.with_name(f'{eia_Path.name}.{os.getpid()}.tmp')
+    tmp.write_bytes(response.content)
+    os.replace(tmp, eia_Path)
+
+
 def get_electricity_imports(year):
-    url = 'https://www.eia.gov/electricity/annual/xls/epa_02_14.xlsx'
+    if not eia_Path.exists():
+        download_electricity_imports()
     sheet = 'epa_02_14'
     c_map = {'Mexico':'MX','Canada':'CA'}
-    df = pd.read_excel(url, sheet_name=sheet,usecols=[0,1,3],
+    df = pd.read_excel(eia_Path, sheet_name=sheet,usecols=[0,1,3],
                        skiprows=[0,1,2,], skipfooter=1)
     df.columns.values[1] = 'Canada'
     df.columns.values[2] = 'Mexico'
@@ -31,9 +31,11 @@ def clean_gloria_M_matrix(M, fields_to_rename, **kwargs):
             .rename(columns=fields_to_rename)
             )
 
-    from generate_import_factors import pull_mrio_data
     # filter dataset with sectors that have reasonable output to avoid outliers
-    output = pull_mrio_data(year, 'output')
+    output = kwargs.get('output')
+    if output is None:
+        from generate_import_factors import pull_mrio_data
+        output = pull_mrio_data(year, 'output', 'gloria')
     M_df = (M_df.merge(output, how = 'left')
             .query('Output > 1000')
             .reset_index(drop=True)
@@ -0,0 +1,134 @@
+"""
+Columnar storage of the processed MRIO resources
+
+Each matrix of a processed MRIO model (M, N, output, Trade Total, Bilateral
+Trade) is stored as its own Parquet file in the folder
+`{source}_resources_{year}` of the resource path. Matrices with stressors as
+rows (M and N) are stored transposed, so that the stressors are columns and
+only the stressors that are used need to be read. The row index, the column
+labels, and the orientation are stored as schema metadata of the file, so
+that the original dataframe is restored on reading. Matrices that already
+have the stressors as columns next to the region and sector columns (like
+the M matrix of CEDA) are stored as they are.
+"""
+
+import json
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+METADATA_KEY = b'mrio_resource'
+TRANSPOSED = ('M', 'N')
+
+
+def store_path(resource_path, source, year):
+    return Path(resource_path) / f'{source}_resources_{year}'
+
+
+def matrix_file(resource_path, source, year, name):
+    return store_path(resource_path, source, year) / f'{name.replace(" ", "_")}.parquet'
+
+
+def has_store(resource_path, source, year):
+    return store_path(resource_path, source, year).is_dir()
+
+
+def write_resources(resources, resource_path, source, year):
+    '''
+    Writes each dataframe of the dictionary of processed MRIO resources to
+    its own Parquet file.
+    '''
+    folder = store_path(resource_path, source, year)
+    folder.mkdir(parents=True, exist_ok=True)
+    for name, df in resources.items():
+        if isinstance(df, pd.Series):
+            df = df.to_frame()
+        transposed = name in TRANSPOSED and stressors_as_rows(df)
+        if transposed:
+            df = df.T
+        write_frame(df, matrix_file(resource_path, source, year, name),
+                    transposed=transposed)
+
+
+def stressors_as_rows(df):
+    '''
+    True when the rows of a matrix are stressors and its columns are the
+    (region, sector) pairs, i.e. all columns are numbers.
+    '''
+    return (isinstance(df.columns, pd.MultiIndex) and
+            all(pd.api.types.is_numeric_dtype(t) for t in df.dtypes))
+
+
+def write_frame(df, file, transposed=False):
+    index_names = [n if n is not None else f'level_{i}'
+                   for i, n in enumerate(df.index.names)]
+    labels = [list(c) if isinstance(c, tuple) else c for c in df.columns]
+    physical = [' | '.join(str(x) for x in c) if isinstance(c, list)
+                else str(c) for c in labels]
+    data = df.copy()
+    data.columns = physical
+    data.index.names = index_names
+    data = data.reset_index()
+    ids = index_names + [c for c in physical
+                         if not pd.api.types.is_numeric_dtype(data[c])]
+    meta = {
+        'transposed': transposed,
+        'index': index_names,
+        'original_index': list(df.index.names),
+        'columns': labels,
+        'column_names': list(df.columns.names),
+        'physical': physical,
+        'ids': ids,
+    }
+    table = pa.Table.from_pandas(data, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        METADATA_KEY: json.dumps(meta).encode('utf-8')})
+    pq.write_table(table, file)
+
+
+def read_meta(file):
+    return json.loads(pq.read_schema(file).metadata[METADATA_KEY])
+
+
+def read_resource(resource_path, source, year, name, columns=None,
+                  stressors=None):
+    '''
+    Reads a matrix of the store in its original orientation. With `columns`,
+    only these data columns (and the identifier columns) are read, e.g. the
+    US column of the bilateral trade. With `stressors`, only the stressor
+    columns (of a transposed matrix, or of a matrix with stressors as
+    columns) are read that are equal to one of the given names or that start
+    with one of them followed by ' -'.
+    '''
+    file = matrix_file(resource_path, source, year, name)
+    meta = read_meta(file)
+    selected = None
+    if columns is not None:
+        selected = [p for p in meta['physical']
+                    if p in columns and p not in meta['ids']]
+    if stressors is not None:
+        prefixes = tuple(f'{s} -' for s in stressors)
+        selected = [
+            p for p, c in zip(meta['physical'], meta['columns'])
+            if p not in meta['ids'] and (
+                (c[0] if isinstance(c, list) else c) in stressors
+                or str(c[0] if isinstance(c, list) else c).startswith(prefixes))]
+    read = None if selected is None else meta['ids'] + [
+        p for p in selected if p not in meta['ids']]
+    data = pq.read_table(file, columns=read, memory_map=True).to_pandas()
+
+    df = data.set_index(meta['index'])
+    df.index.names = meta['original_index']
+    labels = dict(zip(meta['physical'], meta['columns']))
+    cols = [labels[p] for p in df.columns]
+    if any(isinstance(c, list) for c in cols):
+        df.columns = pd.MultiIndex.from_tuples(
+            [tuple(c) for c in cols], names=meta['column_names'])
+    else:
+        df.columns = pd.Index(cols, name=meta['column_names'][0])
+    if meta['transposed']:
+        df = df.T
+    return df
@@ -0,0 +1,86 @@
+"""
+Partitioned Parquet datasets of the import factor outputs
+
+Next to the CSV files, the import factors of all runs are written to the
+Parquet dataset `import_factors` of the output folder, partitioned by
+source, year, schema, and level, e.g.
+`import_factors/source=gloria/year=2019/schema=2017/level=Detail`. Each
+partition contains one file per table: `US` (the factors of the
+`US_*_import_factors` files), `Regional` (`Regional_*_import_factors`), and
+`US_TiVA_approach` (`US_*_import_factors_TiVA_approach`); the table is also
+stored in the column `Table`. All files have the same columns, so that
+consumers can read the factors of any partitions and columns at once:
+
+    pq.read_table(out_Path / 'import_factors',
+                  columns=['Sector', 'Flowable', 'FlowAmount'],
+                  filters=[('source', '=', 'gloria'), ('level', '=', 'Detail'),
+                           ('Table', '=', 'US')])
+
+Flowable, Context, Sector, and Table are dictionary (categorical) encoded.
+The multiplier dataframes are written to the dataset `multiplier_df`,
+partitioned by source, year, and schema; their columns depend on the source.
+Writing a table replaces the file of the table in its partition.
+"""
+
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+FACTORS = 'import_factors'
+MULTIPLIERS = 'multiplier_df'
+CATEGORICAL = ('Table', 'Sector', 'Flowable', 'Context')
+
+_category = pa.dictionary(pa.int32(), pa.string())
+FACTOR_SCHEMA = pa.schema(
+    [(c, _category if c in CATEGORICAL else pa.string()) for c in (
+        'Table', 'Region', 'Sector', 'Flow', 'Compartment', 'Unit', 'Year',
+        'PriceType', 'Flowable', 'Context', 'FlowUUID', 'ReferenceCurrency')] +
+    [('FlowAmount', pa.float64()), ('BaseIOLevel', pa.string()),
+     ('source', pa.string()), ('year', pa.int32()), ('schema', pa.int32()),
+     ('level', pa.string())])
+
+
+def write_factors(df, out_path, table, source, year, schema, level):
+    '''
+    Writes the import factors of a table (`US`, `Regional`, or
+    `US_TiVA_approach`) to the partition (source, year, schema, level) of
+    the factor dataset.
+    '''
+    data = (df.reindex(columns=[f.name for f in FACTOR_SCHEMA][:-4])
+              .assign(Table=table, source=source, year=int(year),
+                      schema=int(schema), level=level))
+    for c in data:
+        if c not in ('FlowAmount', 'year', 'schema'):
+            values = data[c].astype(object)
+            data[c] = values.where(values.isna(), values.astype(str))
+    data = data.astype({c: 'category' for c in CATEGORICAL})
+    _write(pa.Table.from_pandas(data, schema=FACTOR_SCHEMA,
+                                preserve_index=False),
+           Path(out_path) / FACTORS, table,
+           ['source', 'year', 'schema', 'level'])
+
+
+def write_multipliers(df, out_path, source, year, schema):
+    '''
+    Writes a multiplier dataframe to the partition (source, year, schema) of
+    the multiplier dataset.
+    '''
+    data = (df.assign(source=source, year=int(year), schema=int(schema))
+              .astype({c: 'category' for c in (
+                  'BEA Detail', 'BEA Summary', 'Flowable', 'Context')
+                  if c in df}))
+    _write(pa.Table.from_pandas(data, preserve_index=False),
+           Path(out_path) / MULTIPLIERS, MULTIPLIERS,
+           ['source', 'year', 'schema'])
+
+
+def _write(table, root, name, partition_cols):
+    # string columns of concatenated dataframes may be chunked, which would
+    # write a row group per chunk
+    table = table.combine_chunks()
+    # a fixed file name per table, so that the file of the last run of a
+    # partition is replaced
+    pq.write_to_dataset(table, root, partition_cols=partition_cols,
+                        basename_template=f'{name}-{{i}}.parquet',
+                        existing_data_behavior='overwrite_or_ignore')
@@ -1,12 +1,13 @@
 """
-Processes raw CEDA files and stores as a pickle the
+Processes raw CEDA files and stores in the columnar MRIO store the
 relevant matrices for import factors calculation
 """
 
 import pandas as pd
 
 from pathlib import Path
-import pickle as pkl
+
+import mrio_store
 
 
 model_Path = Path(__file__).parent / 'mrio_models'
@@ -126,7 +127,7 @@ def process_ceda(year_start=2017, year_end=2022):
         output = extract_total_usa_output_from_ceda(target_year)
         mrio_objects = {"M": M, "Bilateral Trade": bilateral_trade, "output": output}
 
-        pkl.dump(mrio_objects, open(f"ceda_all_resources_{target_year}.pkl", "wb"))
+        mrio_store.write_resources(mrio_objects, resource_Path, "ceda", target_year)
 
 
 if __name__ == '__main__':
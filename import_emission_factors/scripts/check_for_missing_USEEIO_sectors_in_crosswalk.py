@@ -1,15 +1,16 @@
 '''
 Can check for USEEIO model sectors that do not have mappings in crosswalk
-CAUTION: DOES NOT YET DYNAMICALLY CHANGE IEF Source; its grabbing source that is set in generate_import_factors.py
+of the given IEF source
 '''
 
 import pandas as pd
 from import_emission_factors.generate_import_factors import get_mrio_to_useeio_concordance
 
 schema = 2017
+source = 'gloria' # options are 'exiobase', 'ceda', 'gloria'
 
 
-cw = get_mrio_to_useeio_concordance(schema)
+cw = get_mrio_to_useeio_concordance(schema, source)
 useeio_sectors_in_cw = set(pd.unique(cw.get('BEA Detail').values))
 
 useeio_sectors = pd.read_csv("import_emission_factors/concordances/useeio_internal_concordance.csv")
@@ -6,12 +6,14 @@ import pandas as pd
 from pathlib import Path
 
 out_Path = Path(__file__).parent.parent / 'output'
-mrio = 'exio'
+source = 'gloria'
+schema = 2017
 years = range(2017, 2023)
+sch = f'{str(schema)[-2:]}sch'
 
 df_list = []
 for y in years:
-    df = pd.read_csv(out_Path / f'import_shares_comparison_{y}.csv',
+    df = pd.read_csv(out_Path / f'import_shares_comparison_{source}_{y}_{sch}.csv',
                      skiprows=2)
     df.columns = ['BEA Summary', 'Year', 'mean', 'min', 'max']
     df_list.append(df)
@@ -25,4 +27,4 @@ df = df.pivot(columns='Year', index='BEA Summary', values='difference')
 for y in years:
     df[y] = df[y].str.replace('0.0', '0', regex=False)
     df[y] = df[y].str.replace('0% [0%, 0%]', '-', regex=False)
-df.to_csv(out_Path / 'import_shares_comparison.csv')
+df.to_csv(out_Path / f'import_shares_comparison_{source}_{sch}.csv')
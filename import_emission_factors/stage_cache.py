@@ -0,0 +1,123 @@
+"""
+Content-hashed cache of the stages of the import factor pipeline
+
+The result of a stage (e.g. the import shares or the cleaned M matrix of a
+year) is stored as a pickle `{stage}_{key}.pkl` in the `stage_cache` folder.
+The key is a hash of everything the result depends on: the content of the
+input files, the entries of the MRIO config, parameters like the year and
+schema, the code version (the source code of the modules that compute the
+stage), and the keys of the stages it uses. A stage is only computed when
+there is no result for its key, so that unchanged stages are skipped and
+stale stages are recomputed after any of their inputs changed. Results of
+old keys are not deleted; the folder can be removed at any time.
+"""
+
+import hashlib
+import json
+import os
+import pickle as pkl
+from importlib import metadata
+from pathlib import Path
+
+import pandas as pd
+
+cache_Path = Path(__file__).parent / 'stage_cache'
+
+_file_hashes = {}
+
+
+def cached(stage, key, compute):
+    '''
+    Returns the result of the stage for the key from the cache, or computes
+    it with `compute()` and stores it. The results of a stage are shared by
+    all runs and must not be modified.
+    '''
+    result = load(stage, key)
+    if result is None:
+        result = compute()
+        store(stage, key, result)
+    else:
+        print(f'Using cached {stage}')
+    return result
+
+
+def load(stage, key):
+    '''
+    Returns the stored result of the stage for the key, or None.
+    '''
+    file = _file(stage, key)
+    if not file.exists():
+        return None
+    with open(file, 'rb') as f:
+        return pkl.load(f)
+
+
+def store(stage, key, result):
+    cache_Path.mkdir(exist_ok=True)
+    file = _file(stage, key)
+    # write to a temporary file first, so that concurrent runs never read a
+    # partly written result
+    tmp = file.with_name(f'{file.name}.{os.getpid()}.tmp')
+    with open(tmp, 'wb') as f:
+        pkl.dump(result, f, protocol=pkl.HIGHEST_PROTOCOL)
+    os.replace(tmp, file)
+
+
+def _file(stage, key):
+    return cache_Path / f'{stage}_{key[:20]}.pkl'
+
+
+def stage_key(*parts):
+    '''
+    Returns the hash of the given parts, e.g. file hashes, config entries,
+    and the keys of other stages. Dataframes (like the mapping file of the
+    config) are hashed by their content.
+    '''
+    text = json.dumps(parts, sort_keys=True, default=_to_json)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _to_json(obj):
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        names = list(obj.columns) if isinstance(obj, pd.DataFrame) else [obj.name]
+        values = pd.util.hash_pandas_object(obj, index=True).to_numpy()
+        return [str(n) for n in names] + [
+            hashlib.sha256(values.tobytes()).hexdigest()]
+    if isinstance(obj, Path):
+        return str(obj)
+    return repr(obj)
+
+
+def file_hash(path):
+    '''
+    Returns the hash of the content of a file, or None if it does not exist.
+    The hashes are memoized by the size and modification time of the files.
+    '''
+    path = Path(path)
+    if not path.is_file():
+        return None
+    stat = path.stat()
+    memo = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+    if memo not in _file_hashes:
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        _file_hashes[memo] = h.hexdigest()
+    return _file_hashes[memo]
+
+
+def code_version(*modules):
+    '''
+    Returns the hash of the source files of the given modules of this folder,
+    e.g. `code_version('generate_import_factors', 'gloria_helpers')`.
+    '''
+    return stage_key(*[file_hash(Path(__file__).parent / f'{m}.py')
+                       for m in modules])
+
+
+def package_version(package):
+    try:
+        return metadata.version(package)
+    except metadata.PackageNotFoundError:
+        return None
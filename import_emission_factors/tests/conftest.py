@@ -0,0 +1,181 @@
+import io
+import shutil
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+import yaml
+
+# the modules of the import factor pipeline are scripts in the parent folder
+sys.path.insert(0, str(Path(__file__).parents[1]))
+
+import generate_import_factors as gif
+import generate_import_shares as gis
+import mrio_store
+import stage_cache
+
+YEAR = 2019
+SCHEMA = 2017
+SOURCES = ('gloria', 'gloria_b')
+COUNTRIES = {'CHN': 'China', 'DEU': 'Germany', 'CAN': 'Canada',
+             'MEX': 'Mexico', 'USA': 'United States'}
+
+
+class Pipeline:
+    '''
+    The folders of the pipeline in a test and helpers to run it.
+    '''
+    def __init__(self, root):
+        self.root = root
+        self.out = root / 'output'
+        self.concordance = (root / 'concordances' /
+                            'GLORIA_to_useeio2_commodity_concordance.csv')
+        self.offline = False
+        self.downloads = 0
+        self.set_electricity_imports({YEAR: (5e7, 1.5e6)})
+
+    def set_electricity_imports(self, imports):
+        '''
+        Sets the EIA workbook that is downloaded, from the imports from
+        Canada and Mexico (in MWh) by year.
+        '''
+        self.eia_workbook = _eia_workbook(imports)
+
+    def get(self, url, **kwargs):
+        '''Serves the EIA workbook in place of `requests.get`.'''
+        assert url == gis.eia_url
+        self.downloads += 1
+        if self.offline:
+            raise requests.ConnectionError('offline')
+        return _Response(self.eia_workbook)
+
+    def outputs(self):
+        '''
+        Returns the content of the files of the output folder (the CSV files
+        and the Parquet datasets) by their relative paths.
+        '''
+        return {f.relative_to(self.out).as_posix(): f.read_bytes()
+                for f in sorted(self.out.rglob('*')) if f.is_file()}
+
+    def clear_outputs(self):
+        shutil.rmtree(self.out)
+        self.out.mkdir()
+
+    def clear_cache(self):
+        shutil.rmtree(stage_cache.cache_Path, ignore_errors=True)
+        gif._read_mrio_to_useeio_concordance.cache_clear()
+
+
+def _write_mrio(resource_path, source, year, sectors, seed):
+    rng = np.random.default_rng(seed)
+    cols = pd.MultiIndex.from_product([list(COUNTRIES), sectors],
+                                      names=['region', 'sector'])
+    mapping = pd.read_csv(gif.dataPath / 'gloria_mapping.csv')
+    stressors = list(mapping['SourceFlowName']) + ["'water_use'"]
+    rows = pd.MultiIndex.from_tuples(
+        [(s, 'Emissions') for s in stressors], names=['stressor', 'category'])
+    M = pd.DataFrame(rng.random((len(rows), len(cols))) * 1e-6,
+                     index=rows, columns=cols)
+    output = pd.DataFrame({'indout': rng.random(len(cols)) * 1e5}, index=cols)
+    output.iloc[::7] = 10.0  # dropped by the output filter of GLORIA
+    exports = rng.random(len(cols)) * 100
+    exports[rng.random(len(cols)) < 0.3] = 0.0
+    trade = pd.DataFrame({'USA': exports, 'DEU': rng.random(len(cols))},
+                         index=cols)
+    mrio_store.write_resources({'M': M, 'output': output,
+                                'Bilateral Trade': trade},
+                               resource_path, source, year)
+
+
+def _imports_data(year, schema=2012):
+    '''Census imports of a few countries in place of the API responses.'''
+    details = sorted(set(
+        pd.read_csv(gis.conPath / 'useeio_internal_concordance.csv',
+                    dtype=str)[f'USEEIO_Detail_{schema}'].dropna()))
+    rng = np.random.default_rng(int(year) + schema)
+    countries = ['China', 'Germany', 'Canada', 'Mexico']
+    return pd.DataFrame({
+        'BEA Detail': np.repeat(details, len(countries)),
+        'Year': str(year),
+        'Country': countries * len(details),
+        'Import Quantity': rng.random(len(details) * len(countries)) * 1e6,
+        'Unit': 'USD', 'Source': 'Census'})
+
+
+def _eia_workbook(imports):
+    '''A workbook in the layout of the EIA table 2.14.'''
+    df = pd.DataFrame(
+        [(year, ca, ca / 10, mx, mx / 10)
+         for year, (ca, mx) in sorted(imports.items())] +
+        [('Source: synthetic', None, None, None, None)],
+        columns=['Year', 'Canada imports', 'Canada exports',
+                 'Mexico imports', 'Mexico exports'])
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer) as writer:
+        df.to_excel(writer, sheet_name='epa_02_14', startrow=3, index=False)
+    return buffer.getvalue()
+
+
+class _Response:
+    def __init__(self, content):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    '''
+    Points the import factor pipeline to copies of its data and concordances
+    in tmp_path, with synthetic processed GLORIA resources for the sources
+    `gloria` and `gloria_b` (with the config of GLORIA) and synthetic import
+    data in place of the API responses. The EIA workbook is downloaded from
+    `Pipeline.eia_workbook`, unless `Pipeline.offline` is set. The MRIO to
+    USEEIO concordance is shortened to keep the runs small.
+    '''
+    data = tmp_path / 'data'
+    con = tmp_path / 'concordances'
+    shutil.copytree(gif.dataPath, data)
+    shutil.copytree(gif.conPath, con)
+    with open(data / 'mrio_config.yml') as f:
+        config = yaml.safe_load(f)
+    config['gloria_b'] = config['gloria']
+    with open(data / 'mrio_config.yml', 'w') as f:
+        yaml.safe_dump(config, f)
+    for source in SOURCES:
+        shutil.copy(con / 'GLORIA_country_concordance.csv',
+                    con / f'{source}_country_concordance.csv')
+    shutil.copy(data / 'gloria_country_names.csv',
+                data / 'gloria_b_country_names.csv')
+    concordance = con / 'GLORIA_to_useeio2_commodity_concordance.csv'
+    lines = concordance.read_text(encoding='utf-8-sig').splitlines()
+    concordance.write_text('\n'.join(lines[:60]) + '\n', encoding='utf-8')
+
+    out = tmp_path / 'output'
+    out.mkdir()
+    pipeline = Pipeline(tmp_path)
+    monkeypatch.setattr(gif, 'dataPath', data)
+    monkeypatch.setattr(gif, 'conPath', con)
+    monkeypatch.setattr(gif, 'resource_Path', tmp_path / 'resources')
+    monkeypatch.setattr(gif, 'out_Path', out)
+    monkeypatch.setattr(gif, 'mrio_cache', gif.MRIOResourceCache())
+    monkeypatch.setattr(gis, 'conPath', con)
+    monkeypatch.setattr(gis, 'out_Path', out)
+    monkeypatch.setattr(gis, 'get_imports_data', _imports_data)
+    monkeypatch.setattr(gis, 'eia_Path',
+                        tmp_path / 'response_data' / 'epa_02_14.xlsx')
+    monkeypatch.setattr(requests, 'get', pipeline.get)
+    monkeypatch.setattr(stage_cache, 'cache_Path', tmp_path / 'stage_cache')
+    gif.get_config.cache_clear()
+    gif._read_mrio_to_useeio_concordance.cache_clear()
+
+    sectors = list(pd.unique(pd.read_csv(concordance)['GLORIA Sector']))
+    for seed, source in enumerate(SOURCES):
+        _write_mrio(gif.resource_Path, source, YEAR, sectors, seed)
+    yield pipeline
+    gif.get_config.cache_clear()
+    gif._read_mrio_to_useeio_concordance.cache_clear()
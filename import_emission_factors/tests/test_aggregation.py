@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import generate_import_factors as gif
+
+
+def _weighted_average(df, data_col, weight_col, agg_cols):
+    '''The per-column weighted average of `esupy.dqi.get_weighted_average`.'''
+    df = df.assign(
+        _data_times_weight=df[data_col] * df[weight_col],
+        _weight_where_notnull=df[weight_col] * pd.notnull(df[data_col]))
+    g = df.groupby(agg_cols)
+    return (g['_data_times_weight'].sum() /
+            g['_weight_where_notnull'].sum()).fillna(0)
+
+
+def test_weighted_averages_match_the_per_column_average():
+    rng = np.random.default_rng(3)
+    n = 200
+    df = pd.DataFrame({'group': rng.integers(0, 12, n),
+                       'weight': rng.random(n) * 10,
+                       'CO2': rng.random(n), 'CH4': rng.random(n)})
+    df.loc[rng.random(n) < 0.2, 'CO2'] = np.nan
+    df.loc[df['group'] == 5, 'CH4'] = np.nan  # no values in a group
+    df.loc[df['group'] == 7, 'weight'] = 0.0  # no weight in a group
+
+    W = sparse.csr_matrix((df['weight'], (df['group'], np.arange(n))),
+                          shape=(12, n))
+    averages = gif.get_weighted_averages(df[['CO2', 'CH4']].to_numpy(), W)
+    for i, c in enumerate(['CO2', 'CH4']):
+        expected = _weighted_average(df, c, 'weight', ['group'])
+        np.testing.assert_allclose(averages[expected.index, i],
+                                   expected.to_numpy(), rtol=1e-12)
+    assert (averages[7] == 0).all()
+
+    means = gif.get_weighted_averages(
+        df[['CH4']].to_numpy(), (W != 0).astype(float), empty=np.nan)
+    assert np.isnan(means[5, 0])
+
+
+def _aggregate_by_merge(mrio_df, mrio_to_useeio, export_field,
+                        use_output_for_electricity):
+    '''The many-to-many merge of the MRIO rows with the concordance.'''
+    df = mrio_df.merge(mrio_to_useeio, on='MRIO Sector', how='left')
+    if use_output_for_electricity:
+        df[export_field] = np.where(df['BEA Detail'].str.startswith('221100'),
+                                    df['Output'], df[export_field])
+    df[export_field] = np.where(df['CountryCode'] == 'US', df['Output'],
+                                df[export_field])
+    df = df.drop(columns=['MRIO Sector', 'Year'])
+    agg_cols = ['BEA Detail', 'CountryCode', 'BaseIOSchema']
+    cols = [c for c in df.columns if c not in [export_field] + agg_cols]
+    agg = df.groupby(agg_cols).agg(
+        {c: 'mean' if c in cols else 'sum' for c in cols + [export_field]})
+    agg2 = agg[agg[export_field] == 0]
+    agg = agg[agg[export_field] > 0].copy()
+    exporting = df[df[export_field] > 0]
+    for c in cols:
+        agg[c] = _weighted_average(exporting, c, export_field, agg_cols)
+    return agg, agg2
+
+
+def test_sparse_aggregation_matches_the_merge():
+    rng = np.random.default_rng(5)
+    sectors = [f'S{i}' for i in range(15)]
+    countries = ['US', 'CN', 'DE', 'MX']
+    n = len(sectors) * len(countries)
+    mrio_df = pd.DataFrame({
+        'CountryCode': np.repeat(countries, len(sectors)),
+        'MRIO Sector': sectors * len(countries),
+        'Year': 2019,
+        'Exports': rng.random(n) * 100,
+        'Output': rng.random(n) * 1000,
+        'CO2': rng.random(n), 'CH4': rng.random(n)})
+    mrio_df.loc[rng.random(n) < 0.6, 'Exports'] = 0.0
+    mrio_df.loc[rng.random(n) < 0.2, 'CO2'] = np.nan
+    # many-to-many, with an unmapped MRIO sector and electricity
+    bea = ['1111A0', '1111B0', '221100', '331110', '336111']
+    pairs = sorted({(s, bea[int(k)]) for s in sectors[1:]
+                    for k in rng.integers(0, len(bea), 2)})
+    mrio_to_useeio = pd.DataFrame(pairs, columns=['MRIO Sector', 'BEA Detail'])
+    mrio_to_useeio['BaseIOSchema'] = 2017
+
+    for use_output in (False, True):
+        agg, agg2 = gif.aggregate_mrio_to_bea(mrio_df, mrio_to_useeio,
+                                              'Exports', use_output)
+        ref, ref2 = _aggregate_by_merge(mrio_df, mrio_to_useeio, 'Exports',
+                                        use_output)
+        for actual, expected in ((agg, ref), (agg2, ref2)):
+            assert len(expected) > 0
+            pd.testing.assert_frame_equal(actual[expected.columns], expected,
+                                          check_names=False,
+                                          check_index_type=False,
+                                          rtol=1e-12)
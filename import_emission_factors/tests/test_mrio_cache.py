@@ -0,0 +1,50 @@
+import pandas as pd
+
+import generate_import_factors as gif
+import mrio_store
+from conftest import YEAR, _write_mrio
+
+
+def _count_reads(monkeypatch):
+    reads = []
+    read_resource = mrio_store.read_resource
+
+    def counting(resource_path, source, year, name, **selection):
+        reads.append((source, year, name))
+        return read_resource(resource_path, source, year, name, **selection)
+    monkeypatch.setattr(mrio_store, 'read_resource', counting)
+    return reads
+
+
+def test_resources_are_read_once(pipeline, monkeypatch):
+    reads = _count_reads(monkeypatch)
+    cache = gif.MRIOResourceCache()
+    M = cache.get('gloria', YEAR, 'M')
+    output = cache.get('gloria', YEAR, 'output')
+    assert cache.get('gloria', YEAR, 'M') is M
+    assert cache.get('gloria', YEAR, 'output') is output
+    cache.get('gloria_b', YEAR, 'M')
+    assert reads == [('gloria', YEAR, 'M'), ('gloria', YEAR, 'output'),
+                     ('gloria_b', YEAR, 'M')]
+
+
+def test_least_recently_used_years_are_evicted(pipeline, monkeypatch,
+                                               capsys):
+    sectors = list(pd.unique(
+        pd.read_csv(pipeline.concordance)['GLORIA Sector']))
+    _write_mrio(gif.resource_Path, 'gloria', YEAR + 1, sectors, 9)
+    reads = _count_reads(monkeypatch)
+
+    cache = gif.MRIOResourceCache()
+    cache.get('gloria', YEAR, 'M')
+    size = cache._sizes[('gloria', YEAR)]
+    # room for the resources of one year only
+    cache = gif.MRIOResourceCache(max_bytes=1.5 * size)
+    cache.get('gloria', YEAR, 'M')
+    cache.get('gloria', YEAR + 1, 'M')
+    assert f'Releasing gloria data for {YEAR}' in capsys.readouterr().out
+    assert list(cache._entries) == [('gloria', YEAR + 1)]
+    cache.get('gloria', YEAR, 'M')
+    assert list(cache._entries) == [('gloria', YEAR)]
+    assert reads == [('gloria', YEAR, 'M'), ('gloria', YEAR, 'M'),
+                     ('gloria', YEAR + 1, 'M'), ('gloria', YEAR, 'M')]
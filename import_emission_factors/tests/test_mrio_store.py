@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import mrio_store
+
+
+def _regions_sectors():
+    return pd.MultiIndex.from_product(
+        [['CHN', 'DEU', 'USA'], ['Coal', 'Steel']], names=['region', 'sector'])
+
+
+def _write_read(tmp_path, resources, source, **selection):
+    mrio_store.write_resources(resources, tmp_path, source, 2019)
+    assert mrio_store.has_store(tmp_path, source, 2019)
+    return {name: mrio_store.read_resource(tmp_path, source, 2019, name,
+                                           **selection.get(name, {}))
+            for name in resources}
+
+
+def test_exiobase_shapes_round_trip(tmp_path):
+    cols = _regions_sectors()
+    rng = np.random.default_rng(1)
+    M = pd.DataFrame(rng.random((3, 6)), columns=cols,
+                     index=pd.Index(['CO2 - combustion - air',
+                                     'CH4 - agriculture - air', 'Water'],
+                                    name='stressor'))
+    output = pd.DataFrame({'indout': rng.random(6)}, index=cols)
+    trade = pd.DataFrame(rng.random((6, 3)), index=cols,
+                         columns=pd.Index(['CHN', 'DEU', 'US'], name='region'))
+    read = _write_read(tmp_path, {'M': M, 'output': output,
+                                  'Bilateral Trade': trade}, 'exiobase')
+    assert mrio_store.read_meta(mrio_store.matrix_file(
+        tmp_path, 'exiobase', 2019, 'M'))['transposed']
+    pd.testing.assert_frame_equal(read['M'], M)
+    pd.testing.assert_frame_equal(read['output'], output)
+    pd.testing.assert_frame_equal(read['Bilateral Trade'], trade)
+
+
+def test_gloria_shapes_round_trip_and_selection(tmp_path):
+    cols = _regions_sectors()
+    rows = pd.MultiIndex.from_tuples(
+        [('co2_total', 'Emissions'), ('ch4_total', 'Emissions'),
+         ('land_use', 'Land')], names=['stressor', 'category'])
+    M = pd.DataFrame(np.arange(18, dtype=float).reshape(3, 6),
+                     index=rows, columns=cols)
+    trade = pd.DataFrame(np.ones((6, 2)), index=cols,
+                         columns=pd.Index(['DEU', 'USA'], name='region'))
+    read = _write_read(tmp_path, {'M': M, 'Bilateral Trade': trade}, 'gloria')
+    pd.testing.assert_frame_equal(read['M'], M)
+
+    M_co2 = mrio_store.read_resource(tmp_path, 'gloria', 2019, 'M',
+                                     stressors=['co2_total', 'ch4_total'])
+    pd.testing.assert_frame_equal(M_co2, M.iloc[:2])
+    usa = mrio_store.read_resource(tmp_path, 'gloria', 2019,
+                                   'Bilateral Trade', columns=['USA'])
+    pd.testing.assert_frame_equal(usa, trade[['USA']])
+
+
+def test_ceda_shapes_round_trip_and_selection(tmp_path):
+    # the M matrix of CEDA has the stressors as columns already
+    M = pd.DataFrame({'country': ['CHN', 'CHN', 'DEU'],
+                      'sector': ['1111A0', '1111B0', '1111A0'],
+                      'CO2': [1.0, 2.0, 3.0], 'CH4': [0.1, 0.2, 0.3],
+                      'SF6': [0.0, 0.0, 1e-9]})
+    trade = pd.DataFrame({'country': ['CHN', 'DEU'],
+                          'sector': ['1111A0', '1111A0'],
+                          'exports_to_usa': [5.0, 0.0]})
+    output = pd.DataFrame(
+        {'industry_output': [10.0, 20.0]},
+        index=pd.MultiIndex.from_tuples([('USA', '1111A0'), ('USA', '1111B0')],
+                                        names=['country', 'sector']))
+    read = _write_read(tmp_path, {'M': M, 'Bilateral Trade': trade,
+                                  'output': output}, 'ceda')
+    assert not mrio_store.read_meta(mrio_store.matrix_file(
+        tmp_path, 'ceda', 2019, 'M'))['transposed']
+    for name, df in (('M', M), ('Bilateral Trade', trade), ('output', output)):
+        pd.testing.assert_frame_equal(read[name], df)
+
+    selected = mrio_store.read_resource(tmp_path, 'ceda', 2019, 'M',
+                                        stressors=['CO2', 'SF6'])
+    pd.testing.assert_frame_equal(selected, M[['country', 'sector', 'CO2', 'SF6']])
+
+
+@pytest.mark.parametrize('shape', ['rows', 'columns'])
+def test_stressors_as_rows(shape):
+    cols = _regions_sectors()
+    M = pd.DataFrame(np.ones((2, 6)), columns=cols, index=['CO2', 'CH4'])
+    if shape == 'columns':
+        M = M.T.reset_index()
+    assert mrio_store.stressors_as_rows(M) == (shape == 'rows')
@@ -0,0 +1,50 @@
+import pandas as pd
+import pyarrow.parquet as pq
+
+import output_store
+
+
+def _factors(sectors, amount):
+    return pd.DataFrame({
+        'Sector': sectors, 'Flowable': 'Carbon dioxide', 'Context': 'emission/air',
+        'Unit': 'kg', 'Year': '2019', 'FlowUUID': 'b6f010fb',
+        'ReferenceCurrency': 'USD', 'PriceType': 'Basic',
+        'FlowAmount': amount, 'BaseIOLevel': 'Detail'})
+
+
+def test_factors_round_trip_by_partition(tmp_path):
+    us = _factors(['1111A0', '1111B0'], [0.5, 0.25])
+    regional = _factors(['1111A0'], [0.75]).assign(Region='CN')
+    output_store.write_factors(us, tmp_path, 'US', 'gloria', 2019, 2017,
+                               'Detail')
+    output_store.write_factors(regional, tmp_path, 'Regional', 'gloria',
+                               2019, 2017, 'Detail')
+    output_store.write_factors(us.assign(FlowAmount=1.0), tmp_path, 'US',
+                               'exiobase', 2019, 2017, 'Detail')
+    # a new run replaces the file of the table in its partition
+    output_store.write_factors(us.assign(FlowAmount=[2.0, 3.0]), tmp_path,
+                               'US', 'gloria', 2019, 2017, 'Detail')
+
+    df = pd.read_parquet(tmp_path / output_store.FACTORS,
+                         columns=['Sector', 'FlowAmount', 'Table'],
+                         filters=[('source', '=', 'gloria'),
+                                  ('Table', '=', 'US')])
+    assert df['Sector'].tolist() == ['1111A0', '1111B0']
+    assert df['FlowAmount'].tolist() == [2.0, 3.0]
+    assert isinstance(df['Sector'].dtype, pd.CategoricalDtype)
+
+    table = pq.read_table(tmp_path / output_store.FACTORS)
+    assert table.num_rows == 5
+    assert set(table.schema.names) == set(output_store.FACTOR_SCHEMA.names)
+
+
+def test_concatenated_frames_are_written_as_one_row_group(tmp_path):
+    parts = [pd.DataFrame({'BEA Detail': [f'{i:06d}'], 'CountryCode': ['CHN'],
+                           'EF': [float(i)]}) for i in range(20)]
+    df = pd.concat(parts, ignore_index=True)
+    output_store.write_multipliers(df, tmp_path, 'gloria', 2019, 2017)
+    files = list((tmp_path / output_store.MULTIPLIERS).rglob('*.parquet'))
+    assert len(files) == 1
+    assert pq.ParquetFile(files[0]).metadata.num_row_groups == 1
+    read = pd.read_parquet(files[0])
+    assert read['EF'].tolist() == df['EF'].tolist()
@@ -0,0 +1,35 @@
+import generate_import_factors as gif
+
+from conftest import SCHEMA, YEAR
+
+
+def _run(capsys):
+    gif.run_jobs([('gloria', YEAR, SCHEMA)])
+    gif._read_mrio_to_useeio_concordance.cache_clear()
+    return capsys.readouterr().out
+
+
+def test_patched_factors_match_a_full_run(pipeline, capsys):
+    _run(capsys)
+    before = pipeline.outputs()
+
+    text = pipeline.concordance.read_text(encoding='utf-8')
+    row = 'Growing maize,1111B0,1111B0\n'
+    assert row in text
+    pipeline.concordance.write_text(
+        text.replace(row, 'Growing maize,1111B0,1111A0\n'), encoding='utf-8')
+    out = _run(capsys)
+    assert "Recalculating sectors with changed mappings: ['1111A0', '1111B0']" in out
+    patched = pipeline.outputs()
+    changed = {name for name in patched if patched[name] != before.get(name)}
+    assert f'US_detail_import_factors_gloria_{YEAR}_17sch.csv' in changed
+
+    pipeline.clear_outputs()
+    pipeline.clear_cache()
+    assert 'Recalculating' not in _run(capsys)
+    full = pipeline.outputs()
+    for level in ('detail', 'summary'):
+        for table in ('US', 'Regional'):
+            name = f'{table}_{level}_import_factors_gloria_{YEAR}_17sch.csv'
+            assert patched[name] == full[name]
+    assert patched == full
@@ -0,0 +1,42 @@
+import multiprocessing
+
+import pytest
+
+import generate_import_factors as gif
+import generate_import_shares as gis
+
+from conftest import SCHEMA, SOURCES, YEAR
+
+
+def test_import_shares_are_generated_once_for_all_sources(pipeline,
+                                                          monkeypatch):
+    calls = []
+    generate = gis.generate_import_shares
+
+    def counted(year, schema):
+        calls.append((year, schema))
+        generate(year, schema)
+    monkeypatch.setattr(gis, 'generate_import_shares', counted)
+
+    gif.run_jobs([(source, YEAR, SCHEMA) for source in SOURCES],
+                 calc_tiva=True)
+    assert calls == [(YEAR, SCHEMA)]
+    names = set(pipeline.outputs())
+    for source in SOURCES:
+        for name in ('import_shares_comparison_detail',
+                     'import_shares_comparison'):
+            assert f'{name}_{source}_{YEAR}_17sch.csv' in names
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork',
+                    reason='the workers must inherit the test folders')
+def test_parallel_jobs_write_the_same_files_as_sequential_jobs(pipeline):
+    jobs = [(source, YEAR, SCHEMA) for source in SOURCES]
+    gif.run_jobs(jobs, calc_tiva=True, workers=2)
+    parallel = pipeline.outputs()
+    assert any('gloria_b' in name for name in parallel)
+
+    pipeline.clear_outputs()
+    pipeline.clear_cache()
+    gif.run_jobs(jobs, calc_tiva=True, workers=1)
+    assert pipeline.outputs() == parallel
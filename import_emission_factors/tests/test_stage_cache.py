@@ -0,0 +1,90 @@
+from pathlib import Path
+
+import pandas as pd
+
+import generate_import_factors as gif
+import generate_import_shares as gis
+import stage_cache
+
+from conftest import SCHEMA, YEAR
+
+
+def _run(capsys, **kwargs):
+    gif.run_jobs([('gloria', YEAR, SCHEMA)], **kwargs)
+    return capsys.readouterr().out
+
+
+def test_cached_computes_once_and_keys_hash_contents(tmp_path, monkeypatch):
+    monkeypatch.setattr(stage_cache, 'cache_Path', tmp_path)
+    calls = []
+    for _ in range(2):
+        assert stage_cache.cached(
+            'stage', 'key', lambda: calls.append(1) or [1, 2]) == [1, 2]
+    assert calls == [1]
+
+    df = pd.DataFrame({'a': [1.0, 2.0]})
+    assert stage_cache.stage_key(df) == stage_cache.stage_key(df.copy())
+    assert stage_cache.stage_key(df) != stage_cache.stage_key(df * 2)
+    assert stage_cache.file_hash(tmp_path / 'missing.csv') is None
+
+
+def test_unchanged_run_uses_the_cached_stages(pipeline, capsys):
+    first = _run(capsys)
+    outputs = pipeline.outputs()
+    second = _run(capsys)
+    assert 'Using cached multiplier_df' not in first
+    for stage in ('import_shares_2019_17sch', 'multiplier_df_gloria_2019_17sch'):
+        assert f'Using cached {stage}' in second
+    assert pipeline.outputs() == outputs
+
+
+def _electricity(pipeline):
+    shares = pd.read_csv(pipeline.out / f'import_shares_{YEAR}_17sch.csv')
+    return (shares.query('Source == "EIA"')
+                  .set_index('Country')['Import Quantity'].to_dict())
+
+
+def test_import_shares_follow_the_local_eia_workbook(pipeline, capsys,
+                                                     monkeypatch):
+    calls = []
+    generate = gis.generate_import_shares
+    monkeypatch.setattr(gis, 'generate_import_shares',
+                        lambda *args: calls.append(args) or generate(*args))
+    # the missing workbook is downloaded once
+    _run(capsys)
+    assert _electricity(pipeline) == {'Canada': 5e7, 'Mexico': 1.5e6}
+    assert pipeline.downloads == 1
+    key = gif.import_shares_key(YEAR, SCHEMA)
+
+    # a rerun does not download the changed workbook
+    pipeline.set_electricity_imports({YEAR: (4e7, 2e6)})
+    _run(capsys)
+    assert (pipeline.downloads, len(calls)) == (1, 1)
+    assert gif.import_shares_key(YEAR, SCHEMA) == key
+
+    _run(capsys, refresh_eia=True)
+    assert (pipeline.downloads, len(calls)) == (2, 2)
+    assert _electricity(pipeline) == {'Canada': 4e7, 'Mexico': 2e6}
+    assert gif.import_shares_key(YEAR, SCHEMA) != key
+
+    # without a connection, the last download is used
+    pipeline.offline = True
+    assert 'EIA electricity imports not downloaded' in \
+        _run(capsys, refresh_eia=True)
+    assert len(calls) == 2
+
+
+def test_aggregated_efs_key_covers_the_import_shares_code(pipeline,
+                                                          monkeypatch):
+    keys = gif.get_stage_keys(YEAR, SCHEMA, 'gloria')
+    file_hash = stage_cache.file_hash
+
+    def changed(path):
+        if Path(path).name == 'generate_import_shares.py':
+            return 'changed'
+        return file_hash(path)
+    monkeypatch.setattr(stage_cache, 'file_hash', changed)
+    changed_keys = gif.get_stage_keys(YEAR, SCHEMA, 'gloria')
+    assert changed_keys['M'] == keys['M']
+    for stage in ('import_shares', 'aggregated_efs', 'multiplier_df'):
+        assert changed_keys[stage] != keys[stage]
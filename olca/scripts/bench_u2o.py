@@ -0,0 +1,201 @@
+"""
+Benchmark of the USEEIO to openLCA converter with synthetic models
+
+Generates synthetic USEEIO API model folders (the `A.bin`, `B.bin`, `C.bin`
+matrices in the layout that `u2o._read_matrix` reads, `sectors.csv`,
+`flows.csv`, `indicators.csv`, `demands.csv`, and the demand vectors in the
+`demands` folder) of the given sizes and converts them with `u2o.convert`.
+For each size, the time of each conversion stage, the number of written
+objects per second, the peak resident set size, and the size of the package
+are reported. Each conversion runs in a fresh process so that the peak memory
+of one size does not hide the peak of the next one.
+
+$ python3 bench_u2o.py --sizes 400 3000 [--flows 2000] [--density 0.1]
+"""
+
+import argparse
+import collections
+import csv
+import json
+import multiprocessing
+import os
+import resource
+import struct
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy
+
+sys.path.append(str(Path(__file__).parents[1]))
+import u2o
+
+CONTEXTS = [('emission/air', 'kg'),
+            ('emission/water', 'kg'),
+            ('emission/soil', 'kg'),
+            ('resource/ground', 'kg'),
+            ('resource/ground', 'MJ'),
+            ('resource/land', 'm2*a'),
+            ('emission/air', 'kBq'),
+            ('Waste/hazardous', 'kg'),
+            ('Waste/non-hazardous', 'kg'),
+            ('Economic & Social', 'p'),
+            ('Economic & Social', 'USD')]
+
+INDICATOR_GROUPS = ['Waste Generated', 'Economic & Social', 'Impact Potential']
+
+STAGES = ['read', 'meta data', 'processes', 'impacts', 'demands', 'close']
+
+
+def write_matrix(path, matrix):
+    """Writes a matrix in the format of `u2o._read_matrix`: the row and
+       column count as little-endian int32 followed by the values as
+       little-endian float64 in column-major order."""
+    rows, cols = matrix.shape
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<i', rows))
+        f.write(struct.pack('<i', cols))
+        f.write(numpy.asarray(matrix, dtype='<f8').tobytes(order='F'))
+
+
+def random_sparse(rng, rows, cols, density, scale=1.0):
+    m = rng.random((rows, cols)) * scale
+    m[rng.random((rows, cols)) >= density] = 0.0
+    return m
+
+
+def write_synthetic_model(folder, sectors, flows, indicators, density,
+                          demands=2, seed=42):
+    """Writes a synthetic USEEIO API model folder."""
+    rng = numpy.random.default_rng(seed)
+    folder = Path(folder)
+    (folder / 'demands').mkdir(parents=True, exist_ok=True)
+
+    # keep the column sums of A below 1 so that I - A is invertible
+    A = random_sparse(rng, sectors, sectors, density)
+    A *= 0.5 / max(1.0, A.sum(axis=0).max())
+    write_matrix(folder / 'A.bin', A)
+    write_matrix(folder / 'B.bin',
+                 random_sparse(rng, flows, sectors, density, 10.0))
+    write_matrix(folder / 'C.bin',
+                 random_sparse(rng, indicators, flows, 0.5, 100.0))
+
+    sector_ids = [f'{i:06d}/US' for i in range(sectors)]
+    with open(folder / 'sectors.csv', 'w', newline='', encoding='utf-8') as f:
+        w = csv.writer(f)
+        w.writerow(['Index', 'ID', 'Name', 'Code', 'Location', 'Category',
+                    'Description'])
+        for i, sector_id in enumerate(sector_ids):
+            w.writerow([i, sector_id, f'Synthetic sector {i}', sector_id[:6],
+                        'US', f'{i % 20:02d}: Sector group/{i % 7}',
+                        f'Synthetic sector {i} of the benchmark model'])
+
+    with open(folder / 'flows.csv', 'w', newline='', encoding='utf-8') as f:
+        w = csv.writer(f)
+        w.writerow(['Index', 'ID', 'Flowable', 'Context', 'Unit', 'UUID'])
+        for i in range(flows):
+            context, unit = CONTEXTS[i % len(CONTEXTS)]
+            w.writerow([i, f'Flow {i}/{context}/{unit}', f'Flow {i}', context,
+                        unit, ''])
+
+    with open(folder / 'indicators.csv', 'w', newline='',
+              encoding='utf-8') as f:
+        w = csv.writer(f)
+        w.writerow(['Index', 'ID', 'Name', 'Code', 'Unit', 'Group'])
+        for i in range(indicators):
+            w.writerow([i, f'Indicator {i}', f'Indicator {i}', f'IND{i}',
+                        'kg', INDICATOR_GROUPS[i % len(INDICATOR_GROUPS)]])
+
+    with open(folder / 'demands.csv', 'w', newline='', encoding='utf-8') as f:
+        w = csv.writer(f)
+        w.writerow(['ID', 'Year', 'Type', 'System', 'Location'])
+        for i in range(demands):
+            demand_id = f'2012_US_Demand{i}_Complete'
+            w.writerow([demand_id, 2012, f'Demand{i}', 'Complete', 'US'])
+            data = [{'sector': sector_id, 'amount': float(rng.random() * 1e6)}
+                    for sector_id in sector_ids if rng.random() < 0.5]
+            with open(folder / 'demands' / f'{demand_id}.json', 'w',
+                      encoding='utf-8') as df:
+                json.dump(data, df)
+
+
+def _timed(stats, stage, fn):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            stats[stage] += time.perf_counter() - start
+    return wrapper
+
+
+def run(folder, zip_path, jobs, background_compression):
+    """Converts the model and returns the statistics of the conversion; the
+       stages are timed by wrapping the module functions that `convert`
+       calls."""
+    stats = collections.defaultdict(float)
+    u2o._Model = _timed(stats, 'read', u2o._Model)
+    u2o._write_meta_data = _timed(stats, 'meta data', u2o._write_meta_data)
+    u2o._write_processes = _timed(stats, 'processes', u2o._write_processes)
+    u2o._write_impacts = _timed(stats, 'impacts', u2o._write_impacts)
+    u2o._write_demand = _timed(stats, 'demands', u2o._write_demand)
+    writer = u2o._PackageWriter
+    writer.close = _timed(stats, 'close', writer.close)
+    writestr = writer.writestr
+
+    def count(self, name, data):
+        stats['objects'] += 1
+        writestr(self, name, data)
+    writer.writestr = count
+
+    start = time.perf_counter()
+    u2o.convert(folder, zip_path, jobs=jobs,
+                background_compression=background_compression)
+    stats['total'] = time.perf_counter() - start
+    stats['bytes'] = os.path.getsize(zip_path)
+    # ru_maxrss is in kilobytes on Linux; the workers are child processes
+    stats['peak_rss'] = 1024 * max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return dict(stats)
+
+
+def bench(size, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, 'model')
+        write_synthetic_model(folder, size, args.flows, args.indicators,
+                              args.density)
+        zip_path = os.path.join(tmp, 'model.zip')
+        # a fresh process per run, so that the peak RSS is the peak of this
+        # conversion only
+        with multiprocessing.Pool(1, maxtasksperchild=1) as pool:
+            return pool.apply(run, (folder, zip_path, args.jobs,
+                                    args.background_compression))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[400, 3000],
+                        help='the numbers of sectors of the synthetic models')
+    parser.add_argument('--flows', type=int, default=2000,
+                        help='the number of elementary and waste flows')
+    parser.add_argument('--indicators', type=int, default=30)
+    parser.add_argument('--density', type=float, default=0.1,
+                        help='the share of non-zero entries in A and B')
+    parser.add_argument('--jobs', type=int, default=1)
+    parser.add_argument('--background-compression',
+                        action=argparse.BooleanOptionalAction, default=None)
+    args = parser.parse_args()
+
+    print(f'{"sectors":>8} ' + ' '.join(f'{s:>10}' for s in STAGES)
+          + f' {"total [s]":>10} {"objects":>8} {"obj/s":>8}'
+          + f' {"peak RSS":>10} {"output":>10}')
+    for size in args.sizes:
+        stats = bench(size, args)
+        print(f'{size:>8} '
+              + ' '.join(f'{stats.get(s, 0.0):>10.2f}' for s in STAGES)
+              + f' {stats["total"]:>10.2f} {int(stats["objects"]):>8}'
+              + f' {stats["objects"] / stats["total"]:>8.0f}'
+              + f' {stats["peak_rss"] / 1e6:>8.0f}MB'
+              + f' {stats["bytes"] / 1e6:>8.1f}MB')
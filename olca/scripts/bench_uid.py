@@ -0,0 +1,62 @@
+"""
+Micro-benchmark of the UUID computation in u2o
+
+Compares the time for the flow and provider IDs of all non-zero entries of a
+synthetic technology matrix when they are hashed with `_uid` on every access
+(as before the ID registry) and when they are taken from the `_IdRegistry` of
+a conversion.
+
+$ python3 bench_uid.py [--sizes 400 3000] [--density 0.25]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy
+
+sys.path.append(str(Path(__file__).parents[1]))
+import u2o
+
+
+def bench(size, density, seed=42):
+    rng = numpy.random.default_rng(seed)
+    sectors = [u2o._Sector([str(i), f'{i:06d}/US', f'Sector {i}', f'{i:06d}',
+                            'US', 'Category', ''])
+               for i in range(size)]
+    # the row positions of the non-zero entries of each column
+    columns = [numpy.flatnonzero(rng.random(size) < density).tolist()
+               for _ in range(size)]
+    nnz = sum(len(c) for c in columns)
+
+    start = time.perf_counter()
+    for column in columns:
+        for pos in column:
+            other = sectors[pos]
+            u2o._uid('flow', other.uid)
+            u2o._uid('process', other.uid)
+    hashed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ids = u2o._IdRegistry()
+    for column in columns:
+        for pos in column:
+            other = sectors[pos]
+            ids.flow_of(other)
+            ids.process_of(other)
+    registry = time.perf_counter() - start
+    return nnz, hashed, registry
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[400, 3000])
+    parser.add_argument('--density', type=float, default=0.25)
+    args = parser.parse_args()
+    print(f'{"sectors":>8} {"non-zeros":>10} {"_uid [s]":>9} '
+          f'{"registry [s]":>13} {"saved [s]":>10} {"speedup":>8}')
+    for size in args.sizes:
+        nnz, hashed, registry = bench(size, args.density)
+        print(f'{size:>8} {nnz:>10} {hashed:>9.2f} {registry:>13.2f} '
+              f'{hashed - registry:>10.2f} {hashed / registry:>7.1f}x')
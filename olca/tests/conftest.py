@@ -0,0 +1,37 @@
+import re
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+
+# u2o and the benchmark are scripts, not packages
+sys.path.insert(0, str(Path(__file__).parents[1]))
+sys.path.insert(0, str(Path(__file__).parents[1] / 'scripts'))
+
+import bench_u2o  # noqa: E402
+
+_CREATION_DATE = re.compile(rb'"creationDate": "[^"]*"')
+
+
+def write_model(folder, sectors=40, flows=25, indicators=6, density=0.2,
+                seed=42):
+    bench_u2o.write_synthetic_model(folder, sectors, flows, indicators,
+                                    density, seed=seed)
+    return str(folder)
+
+
+@pytest.fixture(scope='session')
+def model_folder(tmp_path_factory):
+    return write_model(tmp_path_factory.mktemp('model') / 'USEEIOv2.5-test-22')
+
+
+def package_entries(zip_path):
+    """The entries of a package by name, without creation dates."""
+    with zipfile.ZipFile(zip_path) as z:
+        return {n: _CREATION_DATE.sub(b'', z.read(n)) for n in z.namelist()}
+
+
+def entry_names(zip_path):
+    with zipfile.ZipFile(zip_path) as z:
+        return z.namelist()
@@ -0,0 +1,28 @@
+import argparse
+
+import numpy
+
+import bench_u2o
+import u2o
+
+
+def test_synthetic_model_is_a_valid_model(tmp_path):
+    folder = tmp_path / 'model'
+    bench_u2o.write_synthetic_model(folder, 30, 20, 4, 0.2, demands=3)
+    assert u2o._is_valid_useeio_folder(str(folder))
+    model = u2o._Model(str(folder))
+    assert (len(model.sectors), len(model.flows), len(model.indicators),
+            len(model.demands)) == (30, 20, 4, 3)
+    A = numpy.asarray(model.A)
+    assert A.shape == (30, 30) and numpy.asarray(model.B).shape == (20, 30)
+    assert A.sum(axis=0).max() < 1.0
+    assert model.env_flows and model.waste_flows
+
+
+def test_bench_reports_the_stages_of_a_conversion():
+    args = argparse.Namespace(flows=20, indicators=4, density=0.2, jobs=1,
+                              background_compression=None)
+    stats = bench_u2o.bench(30, args)
+    assert set(bench_u2o.STAGES) <= set(stats)
+    assert stats['objects'] > 30 and stats['bytes'] > 0
+    assert stats['peak_rss'] > 0
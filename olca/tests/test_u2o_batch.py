@@ -0,0 +1,47 @@
+import argparse
+import os
+from pathlib import Path
+
+import u2o
+import u2o_batch
+from conftest import package_entries, write_model
+
+CATALOG = Path(__file__).parents[2] / 'models.csv'
+
+
+def test_read_catalog_of_the_repository(tmp_path):
+    write_model(tmp_path / 'USEEIOv2.5-kinglet-22')
+    (tmp_path / 'USEEIO v2.5-catbird-22').mkdir()
+    (tmp_path / 'phoebe').mkdir()  # a unique alias
+    (tmp_path / 'kingbird').mkdir()  # not unique in the catalog
+
+    models = dict(u2o_batch.read_catalog(str(CATALOG), str(tmp_path)))
+    assert models == {
+        'USEEIOv2.5.1-phoebe-23': str(tmp_path / 'phoebe'),
+        'USEEIOv2.5-kinglet-22': str(tmp_path / 'USEEIOv2.5-kinglet-22'),
+        'USEEIOv2.5-catbird-22': str(tmp_path / 'USEEIO v2.5-catbird-22'),
+    }
+    selected = u2o_batch.read_catalog(str(CATALOG), str(tmp_path),
+                                      ['kinglet', 'USEEIO v2.5-catbird-22'])
+    assert sorted(name for name, _ in selected) == [
+        'USEEIOv2.5-catbird-22', 'USEEIOv2.5-kinglet-22']
+
+
+def test_batch_options_match_single_conversion(tmp_path, model_folder):
+    parser = argparse.ArgumentParser()
+    u2o.add_convert_arguments(parser, batch=True)
+    args = parser.parse_args(['--cutoff', '1e-3', '--digits', '4',
+                              '--results', '--no-product-systems',
+                              '--compression', 'stored'])
+    options = u2o.convert_options(args)
+    assert 'jobs' not in options and 'previous_zip' not in options
+
+    reports = u2o_batch.convert_all([('m', model_folder)],
+                                    str(tmp_path / 'batch'), workers=1,
+                                    **options)
+    assert [r['status'] for r in reports] == ['ok']
+    u2o.convert(model_folder, str(tmp_path / 'single.zip'), **options)
+    batch = package_entries(tmp_path / 'batch' / 'm.zip')
+    assert any(n.startswith('results/') for n in batch)
+    assert batch == package_entries(tmp_path / 'single.zip')
+    assert os.path.exists(tmp_path / 'batch' / 'm_cutoff.csv')
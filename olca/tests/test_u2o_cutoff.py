@@ -0,0 +1,77 @@
+import csv
+from collections import defaultdict
+
+import numpy
+import pytest
+
+import u2o
+
+
+def _read_report(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return {(r['Sector'], r['Matrix'], r['Unit']): r
+                for r in csv.DictReader(f)}
+
+
+def test_relative_cutoff_per_row_compares_only_amounts_of_a_flow():
+    # flows x sectors; the second flow has a much smaller unit
+    B = numpy.array([[1000.0, 1.0, 0.0],
+                     [1e-3, 1e-6, 2e-3]])
+    cols = u2o._SparseColumns.of(B, [0, 1])
+    kept, dropped = cols.cutoff(0.0, 0.01, per_row=True)
+    numpy.testing.assert_array_equal(
+        kept.dense([0, 1, 2], 2), [[1000.0, 0.0, 0.0], [1e-3, 0.0, 2e-3]])
+    numpy.testing.assert_array_equal(
+        dropped.dense([0, 1, 2], 2), [[0.0, 1.0, 0.0], [0.0, 1e-6, 0.0]])
+
+    # per column, the small flow would be cut next to the large one
+    kept, _ = cols.cutoff(0.0, 0.01)
+    assert kept.dense([0, 1, 2], 2)[1, 0] == 0.0
+
+
+def test_absolute_cutoff_applies_to_A_only(tmp_path, model_folder):
+    zip_path = tmp_path / 'cut.zip'
+    u2o.convert(model_folder, str(zip_path), cutoff=0.01)
+    report = _read_report(tmp_path / 'cut_cutoff.csv')
+
+    model = u2o._Model(model_folder)
+    A = u2o._dense(model.A)
+    for sector in model.sectors:
+        column = A[[s.index for s in model.sectors], sector.index]
+        row = report[(sector.sector_id, 'A', 'USD')]
+        assert int(row['Dropped exchanges']) == numpy.count_nonzero(
+            (column != 0) & (numpy.abs(column) < 0.01))
+    assert all(float(r['Dropped']) == 0 for k, r in report.items()
+               if k[1] == 'B')
+
+
+def test_cutoff_report_sums_amounts_per_unit(tmp_path, model_folder):
+    zip_path = tmp_path / 'cut.zip'
+    u2o.convert(model_folder, str(zip_path), relative_cutoff=0.2,
+                cutoff_report=str(tmp_path / 'report.csv'))
+    report = _read_report(tmp_path / 'report.csv')
+
+    model = u2o._Model(model_folder)
+    B = numpy.abs(u2o._dense(model.B))[[f.index for f in model.flows]]
+    drop = (B > 0) & (B < 0.2 * B.sum(axis=1, keepdims=True))
+    expected = defaultdict(lambda: [0.0, 0.0, 0])
+    for i, flow in enumerate(model.flows):
+        for sector in model.sectors:
+            value = B[i, sector.index]
+            if value == 0:
+                continue
+            stats = expected[(sector.sector_id, 'B', flow.unit)]
+            stats[0] += value
+            if drop[i, sector.index]:
+                stats[1] += value
+                stats[2] += 1
+
+    b_rows = {k: r for k, r in report.items() if k[1] == 'B'}
+    assert b_rows.keys() == expected.keys()
+    assert len({k[2] for k in b_rows}) > 1
+    for key, (total, dropped, count) in expected.items():
+        row = b_rows[key]
+        assert float(row['Total']) == pytest.approx(total)
+        assert float(row['Dropped']) == pytest.approx(dropped)
+        assert float(row['Dropped share']) == pytest.approx(dropped / total)
+        assert int(row['Dropped exchanges']) == count
@@ -0,0 +1,46 @@
+import json
+import zipfile
+
+import numpy
+
+import u2o
+
+
+def test_sparse_columns_match_the_dense_matrix():
+    rng = numpy.random.default_rng(1)
+    matrix = rng.random((30, 20))
+    matrix[rng.random((30, 20)) < 0.7] = 0.0
+    row_order = list(rng.permutation(30)[:25])
+    # small blocks, so that the matrix is scanned in several blocks
+    cols = u2o._SparseColumns.of(matrix, row_order, block_size=3)
+    numpy.testing.assert_array_equal(cols.dense(list(range(20)), 25),
+                                     matrix[row_order, :])
+    for col in range(20):
+        rows, values = cols.column(col)
+        assert rows == sorted(rows)
+        assert cols.count(col) == numpy.count_nonzero(matrix[row_order, col])
+        assert values == [matrix[row_order[r], col] for r in rows]
+
+
+def test_exchanges_are_the_non_zero_entries_of_the_matrices(tmp_path,
+                                                           model_folder):
+    path = tmp_path / 'model.zip'
+    u2o.convert(model_folder, str(path))
+    model = u2o._Model(model_folder)
+    A, B = numpy.asarray(model.A), numpy.asarray(model.B)
+    ids = u2o._IdRegistry()
+    flow_ids = {ids.flow_of(s): s.index for s in model.sectors}
+    flow_ids.update({f.uid: f.index for f in model.flows})
+
+    with zipfile.ZipFile(path) as z:
+        for sector in model.sectors:
+            process = json.loads(
+                z.read(f'processes/{ids.process_of(sector)}.json'))
+            tech, envi = numpy.zeros(A.shape[0]), numpy.zeros(B.shape[0])
+            for exchange in process['exchanges'][1:]:
+                target = tech if 'defaultProvider' in exchange else envi
+                target[flow_ids[exchange['flow']['@id']]] = exchange['amount']
+            numpy.testing.assert_array_equal(tech, A[:, sector.index])
+            numpy.testing.assert_array_equal(envi, B[:, sector.index])
+            assert [e['internalId'] for e in process['exchanges']] == \
+                list(range(1, process['lastInternalId'] + 1))
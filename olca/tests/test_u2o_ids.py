@@ -0,0 +1,24 @@
+import u2o
+
+
+def test_registry_returns_the_ids_of_uid(model_folder):
+    sectors = u2o._Model(model_folder).sectors
+    ids = u2o._IdRegistry()
+    for sector in sectors:
+        assert ids.flow_of(sector) == u2o._uid('flow', sector.uid)
+        assert ids.process_of(sector) == u2o._uid('process', sector.uid)
+    assert ids.get('process', 'Cat', 'Sub') == \
+        u2o._uid('process', 'Cat', 'Sub')
+
+
+def test_registry_computes_each_id_once(monkeypatch, model_folder):
+    sectors = u2o._Model(model_folder).sectors
+    calls = []
+    uid = u2o._uid
+    monkeypatch.setattr(u2o, '_uid', lambda *xs: calls.append(xs) or uid(*xs))
+    ids = u2o._IdRegistry()
+    for _ in range(3):
+        for sector in sectors:
+            ids.flow_of(sector)
+            ids.process_of(sector)
+    assert len(calls) == 2 * len(sectors)
@@ -0,0 +1,57 @@
+import json
+import shutil
+
+import numpy
+
+import bench_u2o
+import u2o
+from conftest import package_entries
+
+
+def _apply(previous, incremental):
+    """The entries of the previous package updated by an incremental one."""
+    entries = dict(previous)
+    deleted = json.loads(incremental.pop(u2o._DELETIONS_MANIFEST))['deleted']
+    for name in deleted:
+        del entries[name]
+    entries.update(incremental)
+    return entries
+
+
+def test_unchanged_model_writes_only_the_manifest(tmp_path, model_folder):
+    full, incremental = tmp_path / 'full.zip', tmp_path / 'incremental.zip'
+    u2o.convert(model_folder, str(full))
+    u2o.convert(model_folder, str(incremental), previous_zip=str(full))
+    assert package_entries(incremental) == {
+        u2o._DELETIONS_MANIFEST: b'{"deleted": []}'}
+
+
+def test_incremental_package_updates_the_previous_one(tmp_path, model_folder):
+    full = tmp_path / 'full.zip'
+    u2o.convert(model_folder, str(full))
+
+    # change an elementary flow of the first sector and remove a demand
+    changed = tmp_path / 'changed'
+    shutil.copytree(model_folder, changed)
+    model = u2o._Model(str(changed))
+    B = numpy.array(model.B)
+    B[0, 0] += 1.0
+    bench_u2o.write_matrix(changed / 'B.bin', B)
+    lines = (changed / 'demands.csv').read_text(encoding='utf-8').splitlines()
+    (changed / 'demands.csv').write_text('\n'.join(lines[:-1]) + '\n',
+                                         encoding='utf-8')
+
+    new_full, incremental = tmp_path / 'new.zip', tmp_path / 'incremental.zip'
+    u2o.convert(str(changed), str(new_full))
+    u2o.convert(str(changed), str(incremental), previous_zip=str(full))
+    entries = package_entries(incremental)
+    ids = u2o._IdRegistry()
+    demand = model.demands[-1]
+    assert set(entries) == {
+        u2o._DELETIONS_MANIFEST,
+        f'processes/{ids.process_of(model.sectors[0])}.json'}
+    assert json.loads(entries[u2o._DELETIONS_MANIFEST])['deleted'] == sorted([
+        f'flows/{ids.get("flow", demand.uid)}.json',
+        f'processes/{demand.uid}.json',
+        f'product_systems/{ids.get("product_system", demand.uid)}.json'])
+    assert _apply(package_entries(full), entries) == package_entries(new_full)
@@ -0,0 +1,11 @@
+import u2o
+from conftest import entry_names, package_entries
+
+
+def test_parallel_serialization_writes_the_same_package(tmp_path,
+                                                        model_folder):
+    serial, parallel = tmp_path / 'serial.zip', tmp_path / 'parallel.zip'
+    u2o.convert(model_folder, str(serial), jobs=1)
+    u2o.convert(model_folder, str(parallel), jobs=2)
+    assert entry_names(serial) == entry_names(parallel)
+    assert package_entries(serial) == package_entries(parallel)
@@ -0,0 +1,71 @@
+import argparse
+import csv
+import io
+import json
+import zipfile
+
+import numpy
+import pytest
+
+import u2o
+
+
+def _read_npy(z, name):
+    return numpy.lib.format.read_array(io.BytesIO(z.read(name)))
+
+
+def _read_index(z, name):
+    return list(csv.DictReader(io.StringIO(z.read(name).decode('utf-8'))))
+
+
+def test_library_matrices_and_indices(tmp_path, model_folder):
+    path = tmp_path / 'library.zip'
+    u2o.convert_library(model_folder, str(path))
+    model = u2o._Model(model_folder)
+    A, B = numpy.asarray(model.A), numpy.asarray(model.B)
+    with zipfile.ZipFile(path) as z:
+        tech, inverse, envi, factors, M = (
+            _read_npy(z, f'{n}.npy') for n in ('A', 'INV', 'B', 'C', 'M'))
+        index_A, index_B = _read_index(z, 'index_A.csv'), \
+            _read_index(z, 'index_B.csv')
+        meta = zipfile.ZipFile(io.BytesIO(z.read('meta.zip')))
+        assert json.loads(z.read('library.json'))['name'] == 'library'
+
+    numpy.testing.assert_allclose(tech, numpy.eye(len(A)) - A)
+    numpy.testing.assert_allclose(tech @ inverse, numpy.eye(len(A)),
+                                  atol=1e-12)
+    signs = numpy.array([-1.0 if u2o._is_input_flow(f) else 1.0
+                         for f in model.flows])
+    numpy.testing.assert_allclose(envi, B * signs[:, numpy.newaxis])
+    numpy.testing.assert_allclose(M, envi @ inverse)
+    assert factors.shape == (len(model.impact_indicators), len(model.flows))
+
+    # the indices refer to the objects of the JSON-LD meta data
+    names = set(meta.namelist())
+    for row in index_A:
+        assert f'processes/{row["process ID"]}.json' in names
+        assert f'flows/{row["flow ID"]}.json' in names
+    for row in index_B:
+        assert f'flows/{row["flow ID"]}.json' in names
+    assert [int(r['index']) for r in index_A] == list(range(len(A)))
+
+
+def _parse(*args):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('folder')
+    parser.add_argument('zip')
+    parser.add_argument('bib', nargs='?', default=None)
+    u2o.add_convert_arguments(parser)
+    return parser, parser.parse_args(['model', 'library.zip', *args])
+
+
+def test_package_options_are_rejected_with_library(capsys):
+    u2o._check_library_options(*_parse('--library'))
+    for option in (['--cutoff', '0.1'], ['--roots', '1111A0'],
+                   ['--digits', '4'], ['--compression', 'lzma'],
+                   ['--jobs', '2'], ['--previous', 'old.zip'],
+                   ['--system-processes'], ['--no-product-systems']):
+        with pytest.raises(SystemExit):
+            u2o._check_library_options(*_parse('--library', *option))
+        assert f'{option[0]} cannot be used with --library' in \
+            capsys.readouterr().err
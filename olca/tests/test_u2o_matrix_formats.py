@@ -0,0 +1,46 @@
+import shutil
+
+import numpy
+import pytest
+
+import u2o
+from conftest import package_entries
+
+
+def _save_npz(path, matrix, fmt):
+    """Saves the matrix in the layout of `scipy.sparse.save_npz`."""
+    major = matrix.T if fmt == 'csc' else matrix
+    indptr, indices, data = [0], [], []
+    for line in major:
+        nz = numpy.flatnonzero(line)
+        indices.extend(nz.tolist())
+        data.extend(line[nz].tolist())
+        indptr.append(len(indices))
+    numpy.savez(path, format=numpy.array(fmt), shape=numpy.array(matrix.shape),
+                indptr=numpy.array(indptr, dtype=numpy.int32),
+                indices=numpy.array(indices, dtype=numpy.int32),
+                data=numpy.array(data))
+
+
+@pytest.mark.parametrize('fmt', ['npy', 'csc', 'csr'])
+def test_matrix_formats_write_the_same_package(tmp_path, model_folder, fmt):
+    folder = tmp_path / 'model'
+    shutil.copytree(model_folder, folder)
+    model = u2o._Model(str(folder))
+    for name in ('A', 'B', 'C'):
+        matrix = numpy.array(getattr(model, name))
+        (folder / f'{name}.bin').unlink()
+        if fmt == 'npy':
+            numpy.save(folder / f'{name}.npy', matrix)
+        else:
+            _save_npz(folder / f'{name}.npz', matrix, fmt)
+        numpy.testing.assert_array_equal(
+            u2o._dense(u2o._read_matrix(u2o._matrix_path(str(folder), name))),
+            matrix)
+
+    options = dict(results=True, system_processes=True)
+    u2o.convert(model_folder, str(tmp_path / 'bin.zip'), **options)
+    u2o.convert(str(folder), str(tmp_path / f'{fmt}.zip'), **options)
+    assert package_entries(tmp_path / 'bin.zip') == \
+        package_entries(tmp_path / f'{fmt}.zip')
+    u2o.convert_library(str(folder), str(tmp_path / 'library.zip'))
@@ -0,0 +1,32 @@
+import json
+import zipfile
+
+import u2o
+
+
+def test_process_documentation_is_created_once(tmp_path, monkeypatch,
+                                               model_folder):
+    for cached in (u2o._model_yaml, u2o._metadata, u2o._demand_metadata,
+                   u2o._actors):
+        cached.cache_clear()
+    reads, docs = [], []
+    read_metadata, process_doc = u2o._read_metadata, u2o._process_doc
+    monkeypatch.setattr(u2o, '_read_metadata',
+                        lambda path=None: reads.append(path)
+                        or read_metadata(path))
+    monkeypatch.setattr(u2o, '_process_doc',
+                        lambda *args: docs.append(args) or process_doc(*args))
+
+    path = tmp_path / 'model.zip'
+    u2o.convert(model_folder, str(path))
+    assert len(reads) == len(set(reads))
+    model = u2o._Model(model_folder)
+    # one for the sector processes and one per demand process
+    assert len(docs) == 1 + len(model.demands)
+
+    ids = u2o._IdRegistry()
+    with zipfile.ZipFile(path) as z:
+        documentations = [
+            json.loads(z.read(f'processes/{ids.process_of(s)}.json'))
+            ['processDocumentation'] for s in model.sectors]
+    assert all(d == documentations[0] for d in documentations)
@@ -0,0 +1,107 @@
+import argparse
+import struct
+import zipfile
+
+import pytest
+
+import u2o
+from conftest import entry_names, package_entries
+
+
+@pytest.mark.parametrize('compression', sorted(u2o._COMPRESSION_METHODS))
+def test_background_and_inline_compression_write_the_same_package(
+        tmp_path, model_folder, compression):
+    method = u2o._COMPRESSION_METHODS[compression]
+    inline, background = tmp_path / 'inline.zip', tmp_path / 'background.zip'
+    u2o.convert(model_folder, str(inline), compression=method,
+                background_compression=False)
+    u2o.convert(model_folder, str(background), compression=method)
+    assert entry_names(inline) == entry_names(background)
+    assert package_entries(inline) == package_entries(background)
+    with zipfile.ZipFile(background) as z:
+        assert z.testzip() is None
+        assert {i.compress_type for i in z.infolist()} == {method}
+
+
+def test_compression_level_is_applied(tmp_path, model_folder):
+    sizes = {}
+    for level in (1, 9):
+        path = tmp_path / f'level{level}.zip'
+        u2o.convert(model_folder, str(path), level=level)
+        with zipfile.ZipFile(path) as z:
+            sizes[level] = sum(i.compress_size for i in z.infolist())
+    assert package_entries(tmp_path / 'level1.zip') == \
+        package_entries(tmp_path / 'level9.zip')
+    assert sizes[9] < sizes[1]
+
+
+def _has_zip64_extra(path, info):
+    """Whether the local header of the entry has a ZIP64 extra field."""
+    with open(path, 'rb') as f:
+        f.seek(info.header_offset)
+        header = f.read(30)
+        name_size, extra_size = struct.unpack('<HH', header[26:30])
+        f.seek(name_size, 1)
+        extra = f.read(extra_size)
+    while len(extra) >= 4:
+        tag, size = struct.unpack('<HH', extra[:4])
+        if tag == 0x0001:
+            return True
+        extra = extra[4 + size:]
+    return False
+
+
+def test_streamed_entries_use_zip64_and_match_documents(tmp_path,
+                                                        model_folder):
+    streamed, built = tmp_path / 'streamed.zip', tmp_path / 'built.zip'
+    u2o.convert(model_folder, str(streamed), stream=True)
+    u2o.convert(model_folder, str(built))
+    assert package_entries(streamed) == package_entries(built)
+    # the sector processes are streamed, all other entries are written
+    # with their sizes known in advance
+    sectors = len(u2o._Model(model_folder).sectors)
+    with zipfile.ZipFile(streamed) as z:
+        zip64 = [i.filename for i in z.infolist()
+                 if _has_zip64_extra(streamed, i)]
+        assert len(zip64) == sectors
+        assert all(n.startswith('processes/') for n in zip64)
+        assert z.testzip() is None
+
+
+def test_writer_keeps_the_order_of_the_entries(tmp_path):
+    path = tmp_path / 'order.zip'
+    names = [f'entries/{i}.json' for i in range(200)]
+    with u2o._PackageWriter(str(path)) as writer:
+        for i, name in enumerate(names):
+            if i == 100:
+                writer.writestream('stream.json', lambda: iter(['{', '}']))
+            writer.writestr(name, '{"i": %i}' % i)
+    assert entry_names(path) == names[:100] + ['stream.json'] + names[100:]
+
+
+def test_writer_is_flushed_before_the_workers_are_forked(
+        tmp_path, monkeypatch, model_folder):
+    writers, pool = [], u2o.multiprocessing.Pool
+    init = u2o._PackageWriter.__init__
+
+    def track(self, *args, **kwargs):
+        init(self, *args, **kwargs)
+        writers.append(self)
+
+    def checked_pool(*args, **kwargs):
+        assert not writers[0]._pending
+        return pool(*args, **kwargs)
+    monkeypatch.setattr(u2o._PackageWriter, '__init__', track)
+    monkeypatch.setattr(u2o.multiprocessing, 'Pool', checked_pool)
+    u2o.convert(model_folder, str(tmp_path / 'model.zip'), jobs=2)
+    assert writers
+
+
+def test_background_compression_option():
+    parser = argparse.ArgumentParser()
+    u2o.add_convert_arguments(parser)
+    options = [u2o.convert_options(parser.parse_args(args))
+               ['background_compression'] for args in
+               ([], ['--background-compression'],
+                ['--no-background-compression'])]
+    assert options == [None, True, False]
@@ -0,0 +1,46 @@
+import json
+import zipfile
+
+import numpy
+import pytest
+
+import u2o
+
+
+@pytest.fixture(scope='module')
+def solved(tmp_path_factory, model_folder):
+    path = tmp_path_factory.mktemp('results') / 'model.zip'
+    u2o.convert(model_folder, str(path), results=True)
+    model = u2o._Model(model_folder)
+    A, B = numpy.asarray(model.A), numpy.asarray(model.B)
+    L = numpy.linalg.inv(numpy.eye(len(A)) - A)
+    return path, model, B, L
+
+
+def test_results_match_the_dense_solution(solved):
+    path, model, B, L = solved
+    C = numpy.asarray(model.C)
+    indicators = model.impact_indicators
+    ids = u2o._IdRegistry()
+    by_id = {s.sector_id: s.index for s in model.sectors}
+    with zipfile.ZipFile(path) as z:
+        for demand in model.demands:
+            with open(f'{model.folder_path}/demands/{demand.demand_id}.json',
+                      encoding='utf-8') as f:
+                y = numpy.zeros(len(model.sectors))
+                for d in json.load(f):
+                    y[by_id[d['sector']]] += d['amount']
+            g = B @ L @ y
+            result = json.loads(
+                z.read(f'results/{ids.get("result", demand.uid)}.json'))
+            assert result['productSystem']['@id'] == \
+                ids.get('product_system', demand.uid)
+            ref, *flows = result['flowResults']
+            assert ref['isRefFlow'] and ref['amount'] == pytest.approx(y.sum())
+            amounts = {r['flow']['@id']: r['amount'] for r in flows}
+            for pos, flow in enumerate(model.flows):
+                assert amounts.get(flow.uid, 0.0) == pytest.approx(g[pos])
+            h = C[[i.index for i in indicators], :] @ g
+            numpy.testing.assert_allclose(
+                [r['amount'] for r in result['impactResults']], h)
+
@@ -0,0 +1,89 @@
+import json
+import zipfile
+
+import numpy
+
+import u2o
+from conftest import write_model
+
+
+def _reachable(A, roots):
+    """The sectors that the roots depend on, from the powers of A."""
+    reached = numpy.zeros(len(A), dtype=bool)
+    reached[roots] = True
+    while True:
+        step = reached | ((A[:, reached] != 0).any(axis=1))
+        if (step == reached).all():
+            return numpy.flatnonzero(reached).tolist()
+        reached = step
+
+
+def test_roots_export_their_upstream_closure(tmp_path):
+    folder = write_model(tmp_path / 'model', sectors=60, density=0.02, seed=7)
+    model = u2o._Model(folder)
+    A, B = numpy.asarray(model.A), numpy.asarray(model.B)
+    roots = [model.sectors[3], model.sectors[41]]
+    expected = _reachable(A, [3, 41])
+    assert 1 < len(expected) < len(model.sectors)
+
+    path = tmp_path / 'subset.zip'
+    u2o.convert(folder, str(path), roots=[roots[0].sector_id, roots[1].code])
+    ids = u2o._IdRegistry()
+    with zipfile.ZipFile(path) as z:
+        names = set(z.namelist())
+        flows = {n for n in names if n.startswith('flows/')}
+        for pos, sector in enumerate(model.sectors):
+            entry = f'processes/{ids.process_of(sector)}.json'
+            assert (entry in names) == (pos in expected)
+            if pos in expected:
+                process = json.loads(z.read(entry))
+                for e in process['exchanges']:
+                    if 'defaultProvider' in e:
+                        assert f'processes/{e["defaultProvider"]["@id"]}.json' \
+                            in names
+    used = numpy.flatnonzero((B[:, expected] != 0).any(axis=1))
+    for pos, flow in enumerate(model.flows):
+        assert (f'flows/{flow.uid}.json' in flows) == (pos in used)
+
+
+def test_unknown_root_writes_no_package(tmp_path, model_folder):
+    path = tmp_path / 'subset.zip'
+    u2o.convert(model_folder, str(path), roots=['999999/US'])
+    assert not path.exists()
+
+
+def test_code_selects_the_sectors_of_all_regions(tmp_path):
+    folder = write_model(tmp_path / 'model', sectors=40, density=0.02,
+                         seed=11)
+    # a two-region model: the second half repeats the codes of the first
+    sectors_csv = tmp_path / 'model' / 'sectors.csv'
+    header, *rows = sectors_csv.read_text(encoding='utf-8').splitlines()
+    regions = []
+    for i, row in enumerate(rows):
+        index, _, name, code, _, rest = row.split(',', 5)
+        region = 'US' if i < 20 else 'RoUS'
+        code = f'{i % 20:06d}'
+        regions.append(f'{index},{code}/{region},{name},{code},{region},{rest}')
+    sectors_csv.write_text('\n'.join([header] + regions) + '\n',
+                           encoding='utf-8')
+    model = u2o._Model(folder)
+    A = numpy.asarray(model.A)
+
+    path = tmp_path / 'subset.zip'
+    u2o.convert(folder, str(path), roots=['000005'])
+    expected = _reachable(A, [5, 25])
+    ids = u2o._IdRegistry()
+    with zipfile.ZipFile(path) as z:
+        names = set(z.namelist())
+    assert {pos for pos, s in enumerate(model.sectors)
+            if f'processes/{ids.process_of(s)}.json' in names} == \
+        set(expected)
+
+    # a sector ID selects a single region
+    single = tmp_path / 'single.zip'
+    u2o.convert(folder, str(single), roots=['000005/RoUS'])
+    with zipfile.ZipFile(single) as z:
+        names = set(z.namelist())
+    assert {pos for pos, s in enumerate(model.sectors)
+            if f'processes/{ids.process_of(s)}.json' in names} == \
+        set(_reachable(A, [25]))
@@ -0,0 +1,24 @@
+import json
+
+import u2o
+from conftest import package_entries
+
+
+def test_json_chunks_are_the_json_of_the_object():
+    obj = {'@id': 'p', 'exchanges': None, 'name': 'ä "quoted"', 'n': 1.5}
+    items = [{'amount': 0.1 * i, 'flow': {'@id': str(i)}} for i in range(5)]
+    text = ''.join(u2o._json_chunks(obj, 'exchanges', iter(items)))
+    assert text == json.dumps(dict(obj, exchanges=items))
+    assert ''.join(u2o._json_chunks(obj, 'exchanges', iter([]))) == \
+        json.dumps(dict(obj, exchanges=[]))
+
+
+def test_streamed_incremental_package(tmp_path, model_folder):
+    full = tmp_path / 'full.zip'
+    u2o.convert(model_folder, str(full))
+    incremental = tmp_path / 'incremental.zip'
+    u2o.convert(model_folder, str(incremental), previous_zip=str(full),
+                stream=True)
+    # the streamed processes have the content hashes of the built ones
+    assert package_entries(incremental) == {
+        u2o._DELETIONS_MANIFEST: b'{"deleted": []}'}
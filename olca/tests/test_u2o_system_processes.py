@@ -0,0 +1,37 @@
+import json
+import zipfile
+
+import numpy
+import pytest
+
+import u2o
+
+
+@pytest.fixture(scope='module')
+def solved(tmp_path_factory, model_folder):
+    path = tmp_path_factory.mktemp('system_processes') / 'model.zip'
+    u2o.convert(model_folder, str(path), system_processes=True)
+    model = u2o._Model(model_folder)
+    A, B = numpy.asarray(model.A), numpy.asarray(model.B)
+    L = numpy.linalg.inv(numpy.eye(len(A)) - A)
+    return path, model, B, L
+
+
+def test_system_processes_are_the_columns_of_m(solved):
+    path, model, B, L = solved
+    M = B @ L
+    ids = u2o._IdRegistry()
+    with zipfile.ZipFile(path) as z:
+        for sector in model.sectors:
+            process = json.loads(z.read(
+                f'processes/{ids.get("system_process", sector.sector_id)}'
+                '.json'))
+            assert process['processType'] == 'LCI_RESULT'
+            assert process['name'] == f'{sector.name} (system process)'
+            assert process['exchanges'][0]['flow']['@id'] == \
+                ids.flow_of(sector)
+            amounts = {e['flow']['@id']: e['amount']
+                       for e in process['exchanges'][1:]}
+            numpy.testing.assert_allclose(
+                [amounts.get(f.uid, 0.0) for f in model.flows],
+                M[:, sector.index])
@@ -0,0 +1,47 @@
+import json
+import zipfile
+
+import u2o
+from conftest import write_model
+
+
+def _read(z, path, uid):
+    return json.loads(z.read(f'{path}/{uid}.json'))
+
+
+def test_product_systems_link_every_technosphere_input(tmp_path):
+    folder = write_model(tmp_path / 'model', sectors=50, density=0.03, seed=3)
+    path = tmp_path / 'model.zip'
+    u2o.convert(folder, str(path))
+    model = u2o._Model(folder)
+    ids = u2o._IdRegistry()
+    with zipfile.ZipFile(path) as z:
+        for demand in model.demands:
+            system = _read(z, 'product_systems',
+                           ids.get('product_system', demand.uid))
+            processes = {p['@id'] for p in system['processes']}
+            links = {(link['process']['@id'],
+                      link['exchange']['internalId']): link
+                     for link in system['processLinks']}
+            assert len(links) == len(system['processLinks'])
+            assert system['refProcess']['@id'] == demand.uid
+            for uid in processes:
+                process = _read(z, 'processes', uid)
+                for e in process['exchanges']:
+                    if not e['input'] or 'defaultProvider' not in e:
+                        continue
+                    link = links.pop((uid, e['internalId']))
+                    assert link['flow']['@id'] == e['flow']['@id']
+                    assert link['provider']['@id'] == \
+                        e['defaultProvider']['@id']
+                    assert link['provider']['@id'] in processes
+            # each link belongs to an exchange of a process of the system
+            assert not links
+
+
+def test_no_product_systems(tmp_path, model_folder):
+    path = tmp_path / 'model.zip'
+    u2o.convert(model_folder, str(path), product_systems=False)
+    with zipfile.ZipFile(path) as z:
+        assert not [n for n in z.namelist()
+                    if n.startswith('product_systems/')]
@@ -8,20 +8,67 @@ standard library. This script can be executed from the command line like this:
 ```
 $ python3 u2o.py [USEEIO data folder] [openLCA JSON-LD zip file]
 ```
+
+The matrices A, B, and C can be dense `.bin` or `.npy` files or sparse `.npz`
+files (CSC or CSR, as written by `scipy.sparse.save_npz`).
+
+With the option `--jobs N`, the process documents are created and serialized
+by a pool of `N` worker processes (`0` uses all CPU cores) while the main
+process appends them to the package in the same order as in the serial mode.
+The package entries are compressed and written by a background thread while
+the next objects are created (see `--background-compression`), and the
+compression can be
+selected with `--compression` and `--level`; see the README for the
+trade-off between throughput and package size.
+
+With the option `--previous [JSON-LD zip file]`, only the objects that are new
+or that changed compared to the given previous package are written, together
+with a manifest `deletions.json` that lists the entries of the previous
+package that are not part of the model anymore.
+
+With the option `--stream`, the exchanges of a process are serialized one by
+one directly into the package entry, so that the document of a very large
+process is never held in memory as a whole.
+
+With the option `--roots [sector ...]`, only the given sectors and their
+upstream supply chain in the technology matrix are exported.
+
+For each demand vector, a product system with the process links of the
+technology matrix is written too (unless `--no-product-systems` is set).
+
+With the option `--results`, the model is solved for all demand vectors and
+their inventory and impact assessment results are written as openLCA results.
+
+With the option `--system-processes`, an aggregated system process with the
+cradle-to-gate inventory of each sector is written in addition.
+
+With the option `--library`, an openLCA library package with the matrices of
+the model and a precomputed Leontief inverse is written instead (see the
+function `convert_library`).
 """
 
+import argparse
+import collections
 import csv
 import json
-import yaml
 import datetime
+import functools
+import hashlib
+import io
+import itertools
 import logging as log
+import multiprocessing
 import os.path
+import re
 import struct
 import sys
+import time
 import uuid
 import zipfile
 
-from typing import Dict, List, Optional, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, \
+    Tuple
 
 import numpy
 
@@ -33,6 +80,22 @@ NOW = datetime.datetime.now().isoformat(timespec='seconds')
 FLOW_STR = 'Flow generated for use in USEEIO models'
 indicators_to_write = ['Waste Generated', 'Economic & Social']
 
+# the manifest of an incremental export with the entries of the previous
+# package that were deleted
+_DELETIONS_MANIFEST = 'deletions.json'
+
+# the creation date of the process documentation changes with every export
+# and is ignored when comparing objects with a previous package
+_CREATION_DATE = re.compile(rb'"creationDate": "[^"]*"')
+
+# the supported compression methods of the zip entries
+_COMPRESSION_METHODS = {
+    'stored': zipfile.ZIP_STORED,
+    'deflate': zipfile.ZIP_DEFLATED,
+    'bzip2': zipfile.ZIP_BZIP2,
+    'lzma': zipfile.ZIP_LZMA,
+}
+
 useeio_source = {'name': 'Ingwersen et al. 2022, USEEIO 2.0',
                  'description': 'Ingwersen, W.; Li, M.; Young, B.; Vendries, J.; Birney, C. '
                          'USEEIO v2.0, the US Environmentally-Extended Input-Output Model V2.0. '
@@ -149,6 +212,342 @@ class _Demand:
         return f'{self.demand_type}, {self.system}, {self.year}'
 
 
+class _CscMatrix:
+    """A sparse matrix in the compressed sparse column (CSC) layout, as it is
+       stored by `scipy.sparse.save_npz` (the arrays `format`, `shape`,
+       `data`, `indices`, and `indptr` of an `.npz` file)."""
+
+    def __init__(self, shape: Tuple[int, int], indptr: numpy.ndarray,
+                 indices: numpy.ndarray, data: numpy.ndarray):
+        self.shape = shape
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+
+    @staticmethod
+    def load(file_path: str) -> '_CscMatrix':
+        with numpy.load(file_path) as npz:
+            fmt = npz['format'].item()
+            if isinstance(fmt, bytes):
+                fmt = fmt.decode('ascii')
+            rows, cols = (int(x) for x in npz['shape'])
+            indptr, indices = npz['indptr'], npz['indices']
+            data = npz['data'].astype(numpy.float64, copy=False)
+        if fmt == 'csc':
+            return _CscMatrix((rows, cols), indptr, indices, data)
+        if fmt == 'csr':
+            # the CSR arrays of a matrix are the CSC arrays of its transpose
+            return _CscMatrix((cols, rows), indptr, indices, data).T
+        raise ValueError(f"unsupported sparse format '{fmt}' in {file_path}")
+
+    @property
+    def T(self) -> '_CscMatrix':
+        """The transpose of the matrix, again in the CSC layout."""
+        rows, cols = self.shape
+        col_of = numpy.repeat(numpy.arange(cols), numpy.diff(self.indptr))
+        order = numpy.lexsort((col_of, self.indices))
+        indptr = numpy.zeros(rows + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(self.indices, minlength=rows),
+                     out=indptr[1:])
+        return _CscMatrix((cols, rows), indptr, col_of[order],
+                          self.data[order])
+
+    def toarray(self) -> numpy.ndarray:
+        rows, cols = self.shape
+        matrix = numpy.zeros((rows, cols))
+        col_of = numpy.repeat(numpy.arange(cols), numpy.diff(self.indptr))
+        matrix[self.indices, col_of] = self.data
+        return matrix
+
+
+def _dense(matrix) -> numpy.ndarray:
+    """Returns the matrix as a dense array."""
+    if isinstance(matrix, _CscMatrix):
+        return matrix.toarray()
+    return numpy.asarray(matrix)
+
+
+class _SparseColumns:
+    """The non-zero entries of a matrix in a column-compressed (CSC) layout.
+
+    The rows are re-indexed by the given row order so that the row positions
+    of a column directly point into the list of sectors or flows from which
+    the order was taken. Rows that are not in that order are dropped.
+    """
+
+    def __init__(self, indptr: numpy.ndarray, indices: numpy.ndarray,
+                 data: numpy.ndarray):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+
+    @staticmethod
+    def of(matrix: numpy.ndarray, row_order: List[int],
+           block_size: int = 512) -> '_SparseColumns':
+        if isinstance(matrix, _CscMatrix):
+            return _SparseColumns._of_csc(matrix, row_order)
+        rows, cols = matrix.shape
+        positions = numpy.full(rows, -1, dtype=numpy.int64)
+        positions[numpy.asarray(row_order, dtype=numpy.int64)] = \
+            numpy.arange(len(row_order), dtype=numpy.int64)
+        counts = numpy.zeros(cols, dtype=numpy.int64)
+        indices: List[numpy.ndarray] = []
+        data: List[numpy.ndarray] = []
+
+        # scan the matrix in column blocks so that a memory mapped matrix
+        # is never loaded into memory as a whole
+        for start in range(0, cols, block_size):
+            block = numpy.asarray(matrix[:, start:start + block_size]).T
+            block_cols, block_rows = numpy.nonzero(block)
+            values = block[block_cols, block_rows]
+            pos = positions[block_rows]
+            keep = pos >= 0
+            block_cols, pos, values = block_cols[keep], pos[keep], values[keep]
+            order = numpy.lexsort((pos, block_cols))
+            counts[start:start + block.shape[0]] = numpy.bincount(
+                block_cols, minlength=block.shape[0])
+            indices.append(pos[order])
+            data.append(values[order])
+
+        indptr = numpy.zeros(cols + 1, dtype=numpy.int64)
+        numpy.cumsum(counts, out=indptr[1:])
+        return _SparseColumns(
+            indptr,
+            numpy.concatenate(indices) if indices else numpy.zeros(0, numpy.int64),
+            numpy.concatenate(data) if data else numpy.zeros(0))
+
+    @staticmethod
+    def _of_csc(matrix: _CscMatrix, row_order: List[int]) -> '_SparseColumns':
+        rows, cols = matrix.shape
+        positions = numpy.full(rows, -1, dtype=numpy.int64)
+        positions[numpy.asarray(row_order, dtype=numpy.int64)] = \
+            numpy.arange(len(row_order), dtype=numpy.int64)
+        col_of = numpy.repeat(numpy.arange(cols), numpy.diff(matrix.indptr))
+        pos = positions[matrix.indices]
+        keep = (pos >= 0) & (matrix.data != 0)
+        col_of, pos, values = col_of[keep], pos[keep], matrix.data[keep]
+        order = numpy.lexsort((pos, col_of))
+        indptr = numpy.zeros(cols + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(col_of, minlength=cols), out=indptr[1:])
+        return _SparseColumns(indptr, pos[order], values[order])
+
+    def cutoff(self, absolute: float = 0.0, relative: float = 0.0,
+               per_row: bool = False
+               ) -> Tuple['_SparseColumns', '_SparseColumns']:
+        """Drops the entries with an absolute value below the `absolute`
+           threshold or below the `relative` share of the absolute total of
+           their column or, with `per_row`, of their row. Returns the
+           remaining and the dropped entries."""
+        cols = len(self.indptr) - 1
+        col_of = numpy.repeat(numpy.arange(cols), numpy.diff(self.indptr))
+        magnitudes = numpy.abs(self.data)
+        group_of = self.indices if per_row else col_of
+        totals = numpy.bincount(group_of, weights=magnitudes)
+        keep = ((magnitudes >= absolute) &
+                (magnitudes >= relative * totals[group_of]))
+        return self._filter(col_of, keep), self._filter(col_of, ~keep)
+
+    def _filter(self, col_of: numpy.ndarray,
+                keep: numpy.ndarray) -> '_SparseColumns':
+        cols = len(self.indptr) - 1
+        indptr = numpy.zeros(cols + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(col_of[keep], minlength=cols),
+                     out=indptr[1:])
+        return _SparseColumns(indptr, self.indices[keep], self.data[keep])
+
+    def column_totals(self, row_groups: numpy.ndarray, groups: int
+                      ) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        """Returns the absolute sums and the numbers of the entries of each
+           column by the groups of their rows, as (groups, columns) arrays;
+           `row_groups` maps the row positions to the groups."""
+        cols = len(self.indptr) - 1
+        col_of = numpy.repeat(numpy.arange(cols), numpy.diff(self.indptr))
+        cells = row_groups[self.indices] * cols + col_of
+        sums = numpy.bincount(cells, weights=numpy.abs(self.data),
+                              minlength=groups * cols)
+        counts = numpy.bincount(cells, minlength=groups * cols)
+        return sums.reshape(groups, cols), counts.reshape(groups, cols)
+
+    def round(self, digits: int) -> '_SparseColumns':
+        """Rounds the values to the given number of significant digits."""
+        data = numpy.array([float(f'{v:.{digits}g}') for v in self.data.tolist()],
+                           dtype=numpy.float64)
+        return _SparseColumns(self.indptr, self.indices, data)
+
+    def select_rows(self, positions: List[int]) -> '_SparseColumns':
+        """Keeps only the rows at the given positions; the rows are
+           re-indexed by their position in that list."""
+        size = max(len(positions) and max(positions),
+                   len(self.indices) and int(self.indices.max())) + 1
+        new_positions = numpy.full(size, -1, dtype=numpy.int64)
+        new_positions[numpy.asarray(positions, dtype=numpy.int64)] = \
+            numpy.arange(len(positions), dtype=numpy.int64)
+        indices = new_positions[self.indices]
+        keep = indices >= 0
+        cols = len(self.indptr) - 1
+        col_of = numpy.repeat(numpy.arange(cols), numpy.diff(self.indptr))
+        indptr = numpy.zeros(cols + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(col_of[keep], minlength=cols),
+                     out=indptr[1:])
+        return _SparseColumns(indptr, indices[keep], self.data[keep])
+
+    def rows_of(self, cols: List[int]) -> List[int]:
+        """Returns the sorted positions of the rows that have non-zero
+           entries in the given columns."""
+        rows = set()
+        for col in cols:
+            rows.update(self.indices[self.indptr[col]:self.indptr[col + 1]]
+                        .tolist())
+        return sorted(rows)
+
+    def dense(self, cols: List[int], rows: int) -> numpy.ndarray:
+        """Returns the given columns as a dense matrix with `rows` rows."""
+        matrix = numpy.zeros((rows, len(cols)))
+        for j, col in enumerate(cols):
+            start, end = self.indptr[col], self.indptr[col + 1]
+            matrix[self.indices[start:end], j] = self.data[start:end]
+        return matrix
+
+    def count(self, col: int) -> int:
+        """Returns the number of non-zero entries of the given column."""
+        return int(self.indptr[col + 1] - self.indptr[col])
+
+    def column(self, col: int) -> Tuple[List[int], List[float]]:
+        """Returns the row positions and values of the non-zero entries of
+           the given column."""
+        start, end = self.indptr[col], self.indptr[col + 1]
+        return self.indices[start:end].tolist(), self.data[start:end].tolist()
+
+
+class _PackageWriter:
+    """Writes the entries of the JSON-LD package.
+
+    With `background` (the default), the entries are compressed and written
+    by a single background thread with `ZipFile.writestr`, in the order in
+    which they were written, while the main thread builds the next objects
+    (zlib, bz2, and lzma release the GIL while compressing). A zip file is
+    written one entry at a time through the public `ZipFile` API, so the
+    compression itself is not parallel. With `background=False`, the entries
+    are compressed and written inline.
+
+    When the content hashes of a `previous` package are given, entries that
+    did not change are skipped and the entries that are not written again
+    are listed in a deletions manifest when the writer is closed.
+    """
+
+    def __init__(self, zip_path, compression: int = zipfile.ZIP_DEFLATED,
+                 level: Optional[int] = None, background: bool = True,
+                 previous: Optional[Dict[str, str]] = None):
+        self.zip_file = zipfile.ZipFile(zip_path, mode='w',
+                                        compression=compression,
+                                        compresslevel=level)
+        self.compression = compression
+        self.level = level
+        self._pool = ThreadPoolExecutor(1) if background else None
+        self._max_pending = 64
+        self._pending: Deque[Future] = collections.deque()
+        self._previous = previous
+        self._seen = set()
+        self.unchanged = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def writestr(self, name: str, data: str):
+        raw = data.encode('utf-8')
+        if self._previous is not None:
+            self._seen.add(name)
+            if self._previous.get(name) == _content_hash(raw):
+                self.unchanged += 1
+                return
+        self._write(name, raw)
+
+    def _write(self, name: str, raw: bytes):
+        if self._pool is None:
+            self.zip_file.writestr(name, raw)
+            return
+        self._pending.append(
+            self._pool.submit(self.zip_file.writestr, name, raw))
+        while self._pending and (len(self._pending) > self._max_pending
+                                 or self._pending[0].done()):
+            self._pending.popleft().result()
+
+    def _flush(self):
+        while self._pending:
+            self._pending.popleft().result()
+
+    def writestream(self, name: str, chunks: Callable[[], Iterable[str]]):
+        """Writes an entry from the text chunks that `chunks` returns,
+           directly into a `ZipFile.open(..., 'w')` stream, so that the
+           content is never held in memory as a whole. In an incremental
+           export, `chunks` is called twice: first for the content hash and,
+           when the entry changed, for writing it."""
+        if self._previous is not None:
+            self._seen.add(name)
+            h = hashlib.sha256()
+            for chunk in chunks():
+                h.update(_CREATION_DATE.sub(b'', chunk.encode('utf-8')))
+            if self._previous.get(name) == h.hexdigest():
+                self.unchanged += 1
+                return
+
+        # keep the order of the entries; the size of the entry is not known
+        # in advance, so that it may need ZIP64 extensions
+        self._flush()
+        with self.zip_file.open(name, 'w', force_zip64=True) as f:
+            buffer: List[str] = []
+            size = 0
+            for chunk in chunks():
+                buffer.append(chunk)
+                size += len(chunk)
+                if size > 65536:
+                    f.write(''.join(buffer).encode('utf-8'))
+                    buffer.clear()
+                    size = 0
+            f.write(''.join(buffer).encode('utf-8'))
+
+    def close(self):
+        if self._previous is not None:
+            deleted = sorted(set(self._previous) - self._seen)
+            self._write(_DELETIONS_MANIFEST,
+                        json.dumps({'deleted': deleted}).encode('utf-8'))
+            log.info('incremental export: %i unchanged and %i deleted entries',
+                     self.unchanged, len(deleted))
+        self._flush()
+        if self._pool is not None:
+            self._pool.shutdown()
+        self.zip_file.close()
+
+
+class _IdRegistry:
+    """Memoizes the name based UUIDs of a conversion.
+
+    `_uid` lower-cases, joins, and hashes its arguments on every call. The
+    same IDs, e.g. of the flow and provider of a sector, are needed for every
+    non-zero entry of the matrices. The registry computes each sector, flow,
+    process, and category ID once per conversion and reuses it.
+    """
+
+    def __init__(self):
+        self._ids: Dict[Tuple[str, ...], str] = {}
+
+    def get(self, *xs: str) -> str:
+        uid = self._ids.get(xs)
+        if uid is None:
+            uid = _uid(*xs)
+            self._ids[xs] = uid
+        return uid
+
+    def flow_of(self, sector: '_Sector') -> str:
+        return self.get('flow', sector.uid)
+
+    def process_of(self, sector: '_Sector') -> str:
+        return self.get('process', sector.uid)
+
+
 class _Source:
 
     def __init__(self, source_dict):
@@ -174,108 +573,484 @@ class _Source:
         return obj
 
 
-def convert(folder_path, zip_path, bib_path=None):
+class _Model:
+    """The matrices and meta data of a USEEIO model folder."""
+
+    def __init__(self, folder_path: str):
+        self.folder_path = folder_path
+
+        # read the matrix files
+        self.A = _read_matrix(_matrix_path(folder_path, 'A'))
+        self.B = _read_matrix(_matrix_path(folder_path, 'B'))
+        self.C = _read_matrix(_matrix_path(folder_path, 'C'))
+
+        # read the meta data CSV files
+        sector_rows = _read_csv(os.path.join(folder_path, 'sectors.csv'))
+        self.sectors: List[_Sector] = [_Sector(row) for row in sector_rows]
+        flow_rows = _read_csv(os.path.join(folder_path, 'flows.csv'))
+        self.flows: List[_Flow] = [_Flow(row) for row in flow_rows]
+        indicator_rows = _read_csv(os.path.join(folder_path, 'indicators.csv'))
+        self.indicators: List[_Indicator] = [
+            _Indicator(row) for row in indicator_rows]
+        demand_rows = _read_csv(os.path.join(folder_path, 'demands.csv'))
+        self.demands: List[_Demand] = [_Demand(row) for row in demand_rows]
+
+    @property
+    def env_flows(self) -> List[_Flow]:
+        return [flow for flow in self.flows
+                if not flow.context.startswith('Waste')]
+
+    @property
+    def waste_flows(self) -> List[_Flow]:
+        return [flow for flow in self.flows
+                if flow.context.startswith('Waste')]
+
+    @property
+    def impact_indicators(self) -> List[_Indicator]:
+        """The indicators that are written as impact categories."""
+        return [i for i in self.indicators if i.group in indicators_to_write]
+
+
+def convert(folder_path, zip_path, bib_path=None, jobs=1,
+            compression=zipfile.ZIP_DEFLATED, level=None,
+            background_compression=None, previous_zip=None, cutoff=0.0,
+            relative_cutoff=0.0, digits=None, cutoff_report=None,
+            stream=False, roots=None, product_systems=True, results=False,
+            system_processes=False):
+    """Converts the model into a JSON-LD package. When root sectors are
+       given (by sector ID, e.g. `1111A0/US`, or code), only these sectors and
+       their upstream supply chain are exported (see `_upstream_closure`).
+       With `product_systems`, a linked product system is written for each
+       demand vector (see `_write_product_system`). With `results`, the
+       model is solved for all demand vectors and the inventory and impact
+       assessment results are written (see `_write_results`). With
+       `system_processes`, an aggregated LCI process is written for each
+       sector (see `_write_system_processes`). Unless
+       `background_compression` is `False`, the package entries are
+       compressed by a background thread (see `_PackageWriter`)."""
     if not _is_valid_useeio_folder(folder_path):
         return
 
-    source_list = []
-    if bib_path:
-        try:
-            SOURCES = _read_metadata('useeio_sources.yml')
-            source_list = generate_sources(bib_path, SOURCES)
-        except:
-            print('error generating source list')
-    # read the matrix files
-    A = _read_matrix(os.path.join(folder_path, 'A.bin'))
-    B = _read_matrix(os.path.join(folder_path, 'B.bin'))
-    C = _read_matrix(os.path.join(folder_path, 'C.bin'))
-
-    # read the meta data CSV files
-    sector_rows = _read_csv(os.path.join(folder_path, 'sectors.csv'))
-    sectors: List[_Sector] = [_Sector(row) for row in sector_rows]
-    flow_rows = _read_csv(os.path.join(folder_path, 'flows.csv'))
-    flows: List[_Flow] = [_Flow(row) for row in flow_rows]
-    env_flows = [flow for flow in flows if not flow.context.startswith('Waste')]
-    waste_flows = [flow for flow in flows if flow.context.startswith('Waste')]
-    indicator_rows = _read_csv(os.path.join(folder_path, 'indicators.csv'))
-    indicators: List[_Indicator] = [_Indicator(row) for row in indicator_rows]
-    demand_rows = _read_csv(os.path.join(folder_path, 'demands.csv'))
-    demands: List[_Demand] = [_Demand(row) for row in demand_rows]
-
-    with zipfile.ZipFile(zip_path, mode='w',
-                         compression=zipfile.ZIP_DEFLATED) as zipf:
-        _write_ref_data(zipf)
-        _write_sources(zipf, source_list)
-        _write_sources(zipf, [_Source(useeio_source)])
-        _write_categories(zipf, 'FLOW',
-                          ['Elementary flows/' + f.context for f in env_flows])
-        _write_categories(zipf, 'FLOW',
-                          [f.context for f in waste_flows])
-        _write_categories(zipf, 'PROCESS', [s.category for s in sectors])
-        _write_categories(zipf, 'FLOW',
-                          ['Technosphere Flows/' + s.category for s in sectors])
-        _write_tech_flows(zipf, sectors)
-        _write_envi_flows(zipf, env_flows, 'ELEMENTARY_FLOW')
-        _write_envi_flows(zipf, waste_flows, 'WASTE_FLOW')
-        _write_processes(zipf, sectors, flows, A, B, source_list)
-        _write_impacts(zipf, [i for i in indicators if i.group in indicators_to_write],
-                              flows, C)
+    source_list = _read_sources(bib_path)
+    model = _Model(folder_path)
+    sectors, flows = model.sectors, model.flows
+
+    previous = None
+    if previous_zip:
+        previous = _read_content_hashes(previous_zip)
+
+    A_cols = _SparseColumns.of(model.A, [s.index for s in sectors])
+    B_cols = _SparseColumns.of(model.B, [f.index for f in flows])
+    if cutoff > 0 or relative_cutoff > 0:
+        # the entries of B have the units of their flows, so that they are
+        # only compared with the entries of the same flow (row)
+        A_cols, A_dropped = A_cols.cutoff(cutoff, relative_cutoff)
+        B_cols, B_dropped = B_cols.cutoff(0.0, relative_cutoff, per_row=True)
+        if not cutoff_report:
+            cutoff_report = os.path.splitext(zip_path)[0] + '_cutoff.csv'
+        _write_cutoff_report(cutoff_report, sectors, flows, A_cols, A_dropped,
+                             B_cols, B_dropped)
+    if roots:
+        closure = _upstream_closure(A_cols, sectors, roots)
+        if closure is None:
+            return
+        flow_positions = B_cols.rows_of([sectors[p].index for p in closure])
+        A_cols = A_cols.select_rows(closure)
+        B_cols = B_cols.select_rows(flow_positions)
+        model.sectors = sectors = [sectors[p] for p in closure]
+        model.flows = flows = [flows[p] for p in flow_positions]
+        log.info('export %i of %i sectors and %i elementary flows',
+                 len(sectors), model.A.shape[0], len(flows))
+    if digits:
+        A_cols, B_cols = A_cols.round(digits), B_cols.round(digits)
+
+    ids = _IdRegistry()
+    background = background_compression is None or background_compression
+    with _PackageWriter(zip_path, compression, level, background,
+                        previous) as zipf:
+        _write_meta_data(zipf, model, source_list, ids)
+        doc = _process_doc(_metadata(), source_list)
+        _write_processes(zipf, sectors, flows, A_cols, B_cols, doc, ids, jobs,
+                         stream)
+        if system_processes:
+            _write_system_processes(zipf, sectors, flows, A_cols, B_cols, doc,
+                                    ids, digits)
+        _write_impacts(zipf, model.impact_indicators, flows, model.C, ids)
 
         # write the demands
         demand_category = {
             '@type': 'Category',
-            '@id': _uid('process', 'demands'),
+            '@id': ids.get('process', 'demands'),
             'name': 'demands',
             'modelType': 'PROCESS',
         }
         _write_obj(zipf, 'categories', demand_category)
-        demand_category['@id'] = _uid('flow', 'demands')
+        demand_category['@id'] = ids.get('flow', 'demands')
         demand_category['modelType'] = 'FLOW'
         _write_obj(zipf, 'categories', demand_category)
-        for demand in demands:
+        if product_systems:
+            demand_category['@id'] = ids.get('product_system', 'demands')
+            demand_category['modelType'] = 'PRODUCT_SYSTEM'
+            _write_obj(zipf, 'categories', demand_category)
+        demand_processes: List[Tuple[_Demand, dict]] = []
+        for demand in model.demands:
             path = os.path.join(
                 folder_path, 'demands', f'{demand.demand_id}.json')
             if os.path.exists(path):
                 with open(path, 'r', encoding='utf-8') as f:
                     demand_data: List[dict] = json.load(f)
-                    _write_demand(zipf, demand, demand_data, sectors)
+                    process = _write_demand(zipf, demand, demand_data,
+                                            sectors, ids)
+                demand_processes.append((demand, process))
+                if product_systems:
+                    _write_product_system(zipf, demand, process, sectors,
+                                          A_cols, ids)
+        if results and demand_processes:
+            _write_results(zipf, demand_processes, sectors, flows,
+                           model.impact_indicators, A_cols, B_cols, model.C,
+                           ids, product_systems)
+
+
+def convert_library(folder_path, library_path, bib_path=None):
+    """Writes the model as an openLCA library package.
+
+    Next to the JSON-LD meta data of the library objects (`meta.zip`), the
+    package contains the matrices and their indices in the format of openLCA
+    libraries: the technology matrix `A.npy` (with the sign convention of
+    openLCA: I - A), its inverse `INV.npy` (the Leontief inverse), the
+    intervention matrix `B.npy`, the characterization factors `C.npy`, the
+    intensities `M.npy` = B * INV, and the index files `index_A.csv`,
+    `index_B.csv`, and `index_C.csv`. The processes, flows, and indicators in
+    the indices have the same UUIDs as in the JSON-LD package of the model.
+    """
+    if not _is_valid_useeio_folder(folder_path):
+        return
 
+    source_list = _read_sources(bib_path)
+    model = _Model(folder_path)
+    sectors, flows = model.sectors, model.flows
+    indicators = model.impact_indicators
+    ids = _IdRegistry()
+
+    # JSON-LD meta data; the processes only contain their reference flows
+    meta = io.BytesIO()
+    with _PackageWriter(meta) as zipf:
+        _write_meta_data(zipf, model, source_list, ids)
+        doc = _process_doc(_metadata(), source_list)
+        for sector in sectors:
+            _write_obj(zipf, 'processes', _init_process(sector, doc, ids))
+        _write_impacts(zipf, indicators, flows, model.C, ids)
+
+    # matrices in the order of the indices; inputs of elementary flows are
+    # negative in openLCA, so their characterization factors are negated too
+    sector_rows = [s.index for s in sectors]
+    flow_rows = [f.index for f in flows]
+    signs = numpy.array([-1.0 if _is_input_flow(f) else 1.0 for f in flows])
+    tech = numpy.eye(len(sectors)) - _dense(
+        model.A)[numpy.ix_(sector_rows, sector_rows)]
+    inverse = numpy.linalg.inv(tech)
+    envi = _dense(model.B)[numpy.ix_(flow_rows, sector_rows)] \
+        * signs[:, numpy.newaxis]
+    factors = _dense(model.C)[numpy.ix_(
+        [i.index for i in indicators], flow_rows)] * signs
+
+    name = os.path.splitext(os.path.basename(library_path))[0]
+    with zipfile.ZipFile(library_path, mode='w',
+                         compression=zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.writestr('library.json', json.dumps({
+            'name': name,
+            'description': _metadata()['description'],
+            'isRegionalized': False,
+            'dependencies': [],
+        }))
+        zip_file.writestr('meta.zip', meta.getvalue())
+        for matrix_name, matrix in [('A', tech), ('INV', inverse),
+                                    ('B', envi), ('C', factors),
+                                    ('M', envi @ inverse)]:
+            info = zipfile.ZipInfo(f'{matrix_name}.npy',
+                                   time.localtime(time.time())[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with zip_file.open(info, 'w', force_zip64=True) as f:
+                numpy.lib.format.write_array(f, matrix)
+
+        _write_index(zip_file, 'index_A.csv', [
+            'index', 'process ID', 'process name', 'process category',
+            'process location', 'flow ID', 'flow name', 'flow category',
+            'flow unit', 'flow type'
+        ], [[i, ids.process_of(s), s.name, s.category, s.location_code,
+             ids.flow_of(s), s.name, 'Technosphere Flows/' + s.category,
+             'USD', 'PRODUCT_FLOW'] for i, s in enumerate(sectors)])
+        _write_index(zip_file, 'index_B.csv', [
+            'index', 'flow ID', 'flow name', 'flow category', 'flow unit',
+            'flow type'
+        ], [[i, f.uid, f.name, f.context, f.unit,
+             'WASTE_FLOW' if f.context.startswith('Waste')
+             else 'ELEMENTARY_FLOW'] for i, f in enumerate(flows)])
+        _write_index(zip_file, 'index_C.csv', [
+            'index', 'indicator ID', 'indicator name', 'indicator unit'
+        ], [[i, ind.uid, ind.name, ind.unit]
+            for i, ind in enumerate(indicators)])
+
+
+def _upstream_closure(A: _SparseColumns, sectors: List[_Sector],
+                      roots: List[str]) -> Optional[List[int]]:
+    """Returns the sorted positions of the given root sectors and of all
+       sectors they depend on, directly or indirectly, following the non-zero
+       entries of the columns of A. A sector code selects the sectors of all
+       regions with that code, e.g. `1111A0` selects `1111A0/US` and
+       `1111A0/RoUS` of a two-region model. Returns `None` if a root sector
+       is not part of the model."""
+    by_key: Dict[str, List[int]] = {}
+    for pos, sector in enumerate(sectors):
+        by_key.setdefault(sector.code.lower(), []).append(pos)
+        by_key[sector.sector_id.lower()] = [pos]
+    queue: List[int] = []
+    for root in roots:
+        positions = by_key.get(root.strip().lower())
+        if positions is None:
+            log.error("root sector '%s' is not part of the model", root)
+            return None
+        if len(positions) > 1:
+            log.info("root sector code '%s' selects the sectors %s", root,
+                     ', '.join(sectors[p].sector_id for p in positions))
+        queue.extend(positions)
+    return _closure_of(A, sectors, queue)
+
+
+def _closure_of(A: _SparseColumns, sectors: List[_Sector],
+                positions: List[int]) -> List[int]:
+    """Returns the sorted positions of the sectors at the given positions and
+       of all their direct and indirect providers in A."""
+    queue = list(positions)
+    visited = set(queue)
+    while queue:
+        pos = queue.pop()
+        start, end = A.indptr[sectors[pos].index], \
+            A.indptr[sectors[pos].index + 1]
+        for provider in A.indices[start:end].tolist():
+            if provider not in visited:
+                visited.add(provider)
+                queue.append(provider)
+    return sorted(visited)
+
+
+def _write_index(zip_file: zipfile.ZipFile, name: str, header: List[str],
+                 rows: List[list]):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(header)
+    writer.writerows(rows)
+    zip_file.writestr(name, buffer.getvalue())
+
+
+def _write_cutoff_report(path: str, sectors: List[_Sector],
+                         flows: List[_Flow], A_kept: _SparseColumns,
+                         A_dropped: _SparseColumns, B_kept: _SparseColumns,
+                         B_dropped: _SparseColumns):
+    """Writes, per sector and unit, the absolute column totals of A (in USD)
+       and of the elementary flows in B with that unit, how much of them was
+       dropped by the cutoff, and the number of dropped exchanges. Amounts
+       of different units are never added up."""
+    units = sorted({f.unit for f in flows})
+    unit_of = numpy.array([units.index(f.unit) for f in flows] or [0],
+                          dtype=numpy.int64)
+    stats = []
+    for matrix, kept, dropped, row_groups, row_units in (
+            ('A', A_kept, A_dropped,
+             numpy.zeros(len(sectors), dtype=numpy.int64), ['USD']),
+            ('B', B_kept, B_dropped, unit_of, units)):
+        kept_sums, _ = kept.column_totals(row_groups, len(row_units))
+        dropped_sums, counts = dropped.column_totals(row_groups,
+                                                     len(row_units))
+        stats.append((matrix, row_units, kept_sums + dropped_sums,
+                      dropped_sums, counts))
+
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Sector', 'Name', 'Matrix', 'Unit', 'Total',
+                         'Dropped', 'Dropped share', 'Dropped exchanges'])
+        for sector in sectors:
+            for matrix, row_units, totals, dropped, counts in stats:
+                for u, unit in enumerate(row_units):
+                    total = totals[u, sector.index]
+                    if total == 0:
+                        continue
+                    writer.writerow([
+                        sector.sector_id, sector.name, matrix, unit, total,
+                        dropped[u, sector.index],
+                        dropped[u, sector.index] / total,
+                        counts[u, sector.index]])
+
+
+def _read_sources(bib_path: Optional[str]) -> List[_Source]:
+    source_list = []
+    if bib_path:
+        try:
+            SOURCES = _read_metadata('useeio_sources.yml')
+            source_list = generate_sources(bib_path, SOURCES)
+        except:
+            print('error generating source list')
+    return source_list
 
-def _write_processes(zip_file: zipfile.ZipFile, sectors: List[_Sector],
-                     flows: List[_Flow], A: numpy.ndarray, B: numpy.ndarray,
-                     source_list: List[_Source]):
-    for sector in sectors:
-        process = _init_process(sector, source_list)
-        exchanges: List[dict] = process['exchanges']
-        iid = 1
 
-        # add tech-flows
-        for tech_flow in _create_tech_exchanges(sector, sectors, A):
-            iid += 1
-            tech_flow['internalId'] = iid
-            exchanges.append(tech_flow)
+def _write_meta_data(zipf: _PackageWriter, model: _Model,
+                     source_list: List[_Source], ids: _IdRegistry):
+    """Writes the reference data, sources, categories, and flows."""
+    sectors = model.sectors
+    env_flows, waste_flows = model.env_flows, model.waste_flows
+    _write_ref_data(zipf)
+    _write_sources(zipf, source_list)
+    _write_sources(zipf, [_Source(useeio_source)])
+    _write_categories(zipf, 'FLOW',
+                      ['Elementary flows/' + f.context for f in env_flows],
+                      ids)
+    _write_categories(zipf, 'FLOW',
+                      [f.context for f in waste_flows], ids)
+    _write_categories(zipf, 'PROCESS', [s.category for s in sectors], ids)
+    _write_categories(zipf, 'FLOW',
+                      ['Technosphere Flows/' + s.category for s in sectors],
+                      ids)
+    _write_tech_flows(zipf, sectors, ids)
+    _write_envi_flows(zipf, env_flows, ids, 'ELEMENTARY_FLOW')
+    _write_envi_flows(zipf, waste_flows, ids, 'WASTE_FLOW')
+
+
+def _write_processes(zip_file: _PackageWriter, sectors: List[_Sector],
+                     flows: List[_Flow], A: _SparseColumns, B: _SparseColumns,
+                     doc: dict, ids: _IdRegistry, jobs: int = 1,
+                     stream: bool = False):
+    context = (sectors, flows, A, B, doc, ids)
+    if stream:
+        if jobs != 1:
+            log.warning('processes are streamed on the main process; '
+                        'the jobs option is ignored')
+        for sector in sectors:
+            _stream_process(zip_file, sector, *context)
+        return
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    if jobs < 2 or len(sectors) < 2:
+        for sector in sectors:
+            _write_obj(zip_file, 'processes', _create_process(sector, *context))
+        return
+
+    # the workers create and serialize chunks of processes; `imap` returns
+    # the chunks in order, so the package has the same entry order as in
+    # the serial mode
+    chunk_size = max(1, len(sectors) // (jobs * 8))
+    chunks = [range(i, min(i + chunk_size, len(sectors)))
+              for i in range(0, len(sectors), chunk_size)]
+    # do not fork while the writer thread may hold the lock of the zip file
+    zip_file._flush()
+    with multiprocessing.Pool(jobs, initializer=_init_process_worker,
+                              initargs=context) as pool:
+        for entries in pool.imap(_serialize_processes, chunks):
+            for name, data in entries:
+                zip_file.writestr(name, data)
+
+
+def _create_process(sector: _Sector, sectors: List[_Sector],
+                    flows: List[_Flow], A: _SparseColumns, B: _SparseColumns,
+                    doc: dict, ids: _IdRegistry) -> dict:
+    process = _init_process(sector, doc, ids)
+    exchanges: List[dict] = process['exchanges']
+    iid = 1
+
+    # add tech-flows
+    for tech_flow in _create_tech_exchanges(sector, sectors, A, ids):
+        iid += 1
+        tech_flow['internalId'] = iid
+        exchanges.append(tech_flow)
 
-        # add envi-flows
-        for envi_flow in _create_envi_exchanges(sector, flows, B):
+    # add envi-flows
+    for envi_flow in _create_envi_exchanges(sector, flows, B):
+        iid += 1
+        envi_flow['internalId'] = iid
+        exchanges.append(envi_flow)
+
+    process['lastInternalId'] = iid
+    return process
+
+
+def _stream_process(zip_file: _PackageWriter, sector: _Sector,
+                    sectors: List[_Sector], flows: List[_Flow],
+                    A: _SparseColumns, B: _SparseColumns, doc: dict,
+                    ids: _IdRegistry):
+    """Writes the process of the sector like `_create_process`, but the
+       exchanges are created and serialized one by one while they are written
+       to the package."""
+    process = _init_process(sector, doc, ids)
+    process['lastInternalId'] = 1 + A.count(sector.index) + B.count(sector.index)
+    process['@context'] = "http://greendelta.github.io/olca-schema/"
+    ref_exchanges = process['exchanges']
+
+    def exchanges() -> Iterator[dict]:
+        yield from ref_exchanges
+        iid = 1
+        for exchange in itertools.chain(
+                _create_tech_exchanges(sector, sectors, A, ids),
+                _create_envi_exchanges(sector, flows, B)):
             iid += 1
-            envi_flow['internalId'] = iid
-            exchanges.append(envi_flow)
+            exchange['internalId'] = iid
+            yield exchange
+
+    zip_file.writestream(
+        f'processes/{process["@id"]}.json',
+        lambda: _json_chunks(process, 'exchanges', exchanges()))
+
+
+def _json_chunks(obj: dict, key: str, items: Iterable) -> Iterator[str]:
+    """Yields the JSON text of the object in chunks, where the list under the
+       given key is taken item by item from `items`. The text is the same as
+       `json.dumps(obj)` with that list."""
+    yield '{'
+    sep = ''
+    for k, v in obj.items():
+        if k != key:
+            yield f'{sep}{json.dumps(k)}: {json.dumps(v)}'
+        else:
+            yield f'{sep}{json.dumps(k)}: ['
+            item_sep = ''
+            for item in items:
+                yield item_sep + json.dumps(item)
+                item_sep = ', '
+            yield ']'
+        sep = ', '
+    yield '}'
 
-        process['lastInternalId'] = iid
-        _write_obj(zip_file, 'processes', process)
+
+# the data of a worker process in the parallel mode of `_write_processes`
+_worker_context: Optional[tuple] = None
 
 
-def _write_demand(zip_file: zipfile.ZipFile, demand: _Demand,
-                  data: List[dict], sectors: List[_Sector]):
+def _init_process_worker(*context):
+    global _worker_context
+    _worker_context = context
+
+
+def _serialize_processes(positions: range) -> List[Tuple[str, str]]:
+    sectors = _worker_context[0]
+    entries = []
+    for pos in positions:
+        process = _create_process(sectors[pos], *_worker_context)
+        entry = _serialize_obj('processes', process)
+        if entry:
+            entries.append(entry)
+    return entries
+
+
+def _write_demand(zip_file: _PackageWriter, demand: _Demand,
+                  data: List[dict], sectors: List[_Sector],
+                  ids: _IdRegistry) -> dict:
     # create the demand flow
     flow = {
         '@type': 'Flow',
-        '@id': _uid('flow', demand.uid),
+        '@id': ids.get('flow', demand.uid),
         'name': demand.name,
         'description': FLOW_STR,
         'version': MODEL_VERSION,
         'flowType': 'PRODUCT_FLOW',
-        'category': {'@id': _uid('flow', 'demands')},
+        'category': {'@id': ids.get('flow', 'demands')},
         'flowProperties': [{
             'referenceFlowProperty': True,
             'conversionFactor': 1.0,
@@ -288,11 +1063,11 @@ def _write_demand(zip_file: zipfile.ZipFile, demand: _Demand,
         '@type': 'Process',
         '@id': demand.uid,
         'name': demand.name,
-        'category': {'@id': _uid('process', 'demands')},
+        'category': {'@id': ids.get('process', 'demands')},
         'version': MODEL_VERSION,
-        'description': demand_metadata['description'],
+        'description': _demand_metadata()['description'],
         'processType': 'UNIT_PROCESS',
-        'processDocumentation': _process_doc(demand_metadata),
+        'processDocumentation': _process_doc(_demand_metadata()),
     }
     if demand.location_code == 'US':
         process['location'] = {'@id': _RefIds.LOCATION_US}
@@ -316,12 +1091,13 @@ def _write_demand(zip_file: zipfile.ZipFile, demand: _Demand,
         iid += 1
         total += amount
         exchanges.append({
+            'internalId': iid,
             'input': True,
             'amount': amount,
-            'flow': {'@id': _uid('flow', sector.uid)},
+            'flow': {'@id': ids.flow_of(sector)},
             'unit': {'@id': _RefIds.UNIT_USD},
             'flowProperty': {'@id': _RefIds.QUANTITY_USD},
-            'defaultProvider': {'@id': _uid('process', sector.uid)}
+            'defaultProvider': {'@id': ids.process_of(sector)}
         })
 
     # add the quantitative reference
@@ -331,7 +1107,7 @@ def _write_demand(zip_file: zipfile.ZipFile, demand: _Demand,
         'input': False,
         'amount': total,
         'quantitativeReference': True,
-        'flow': {'@id': _uid('flow', demand.uid)},
+        'flow': {'@id': ids.get('flow', demand.uid)},
         'unit': {'@id': _RefIds.UNIT_USD},
         'flowProperty': {'@id': _RefIds.QUANTITY_USD},
     })
@@ -339,13 +1115,181 @@ def _write_demand(zip_file: zipfile.ZipFile, demand: _Demand,
     process['exchanges'] = exchanges
     process['lastInternalId'] = iid
     _write_obj(zip_file, 'processes', process)
+    return process
+
+
+def _write_product_system(zip_file: _PackageWriter, demand: _Demand,
+                          demand_process: dict, sectors: List[_Sector],
+                          A: _SparseColumns, ids: _IdRegistry):
+    """Writes the product system of the demand process. The system contains
+       the demanded sectors and their upstream supply chain; the process
+       links are taken directly from the non-zero entries of A, so that the
+       k-th technosphere input of a sector process (internal ID 2 + k) is
+       linked to the process of the sector in the k-th non-zero row of the
+       sector column."""
+    exchanges: List[dict] = demand_process['exchanges']
+    position_of: Dict[str, int] = {
+        ids.flow_of(sector): pos for pos, sector in enumerate(sectors)}
+
+    def ref(model_type: str, uid: str) -> dict:
+        return {'@type': model_type, '@id': uid}
+
+    links: List[dict] = []
+    demanded: List[int] = []
+    for exchange in exchanges[:-1]:
+        pos = position_of[exchange['flow']['@id']]
+        demanded.append(pos)
+        links.append({
+            'provider': ref('Process', ids.process_of(sectors[pos])),
+            'flow': ref('Flow', exchange['flow']['@id']),
+            'process': ref('Process', demand.uid),
+            'exchange': {'internalId': exchange['internalId']},
+        })
+
+    closure = _closure_of(A, sectors, demanded)
+    for pos in closure:
+        sector = sectors[pos]
+        process_id = ids.process_of(sector)
+        providers, _ = A.column(sector.index)
+        for k, provider in enumerate(providers):
+            other = sectors[provider]
+            links.append({
+                'provider': ref('Process', ids.process_of(other)),
+                'flow': ref('Flow', ids.flow_of(other)),
+                'process': ref('Process', process_id),
+                'exchange': {'internalId': 2 + k},
+            })
+
+    ref_exchange = exchanges[-1]
+    system = {
+        '@type': 'ProductSystem',
+        '@id': ids.get('product_system', demand.uid),
+        'name': demand.name,
+        'description': demand_process['description'],
+        'category': {'@id': ids.get('product_system', 'demands')},
+        'version': MODEL_VERSION,
+        'refProcess': ref('Process', demand.uid),
+        'refExchange': {'internalId': ref_exchange['internalId']},
+        'targetAmount': ref_exchange['amount'],
+        'targetUnit': {'@id': _RefIds.UNIT_USD},
+        'targetFlowProperty': {'@id': _RefIds.QUANTITY_USD},
+        'processes': [ref('Process', demand.uid)] + [
+            ref('Process', ids.process_of(sectors[pos])) for pos in closure],
+        'processLinks': links,
+    }
+    _write_obj(zip_file, 'product_systems', system)
+
+
+def _technology_matrix(A: _SparseColumns,
+                       sectors: List[_Sector]) -> numpy.ndarray:
+    """Returns I - A in the order of the sectors."""
+    return numpy.eye(len(sectors)) - A.dense(
+        [sector.index for sector in sectors], len(sectors))
+
+
+def _write_system_processes(zip_file: _PackageWriter, sectors: List[_Sector],
+                            flows: List[_Flow], A: _SparseColumns,
+                            B: _SparseColumns, doc: dict, ids: _IdRegistry,
+                            digits: Optional[int] = None):
+    """Writes a system process (an aggregated LCI result) for each sector:
+       the process has the reference flow of the sector process and the
+       cradle-to-gate inventory of one USD of it as elementary flow
+       exchanges, i.e. the column of the sector in M = B (I - A)^-1. The
+       name of the process has the suffix `(system process)`, so that it can
+       be told apart from the unit process of the sector when a provider of
+       the sector product is selected in openLCA."""
+    # M^T = (I - A)^-T B^T, solved at once for all flows
+    sector_cols = [sector.index for sector in sectors]
+    M = numpy.linalg.solve(_technology_matrix(A, sectors).T,
+                           B.dense(sector_cols, len(flows)).T).T
+    M_full = numpy.zeros((len(flows), len(A.indptr) - 1))
+    M_full[:, sector_cols] = M
+    M_cols = _SparseColumns.of(M_full, list(range(len(flows))))
+    if digits:
+        M_cols = M_cols.round(digits)
+
+    for sector in sectors:
+        process = _init_process(sector, doc, ids)
+        process['@id'] = ids.get('system_process', sector.sector_id)
+        process['name'] = f'{sector.name} (system process)'
+        process['processType'] = 'LCI_RESULT'
+        exchanges: List[dict] = process['exchanges']
+        for envi_flow in _create_envi_exchanges(sector, flows, M_cols):
+            envi_flow['internalId'] = len(exchanges) + 1
+            exchanges.append(envi_flow)
+        process['lastInternalId'] = len(exchanges)
+        _write_obj(zip_file, 'processes', process)
+
+
+def _write_results(zip_file: _PackageWriter,
+                   demand_processes: List[Tuple[_Demand, dict]],
+                   sectors: List[_Sector], flows: List[_Flow],
+                   indicators: List[_Indicator], A: _SparseColumns,
+                   B: _SparseColumns, C: numpy.ndarray, ids: _IdRegistry,
+                   with_systems: bool):
+    """Solves the model for all demand vectors at once and writes the
+       inventory (g = B x) and impact assessment (h = C g) results of each
+       demand as Result objects, where x solves (I - A) x = y. The matrices
+       are the same as in the written processes, thus the results are the
+       results that openLCA would calculate for the product systems of the
+       demands."""
+    position_of: Dict[str, int] = {
+        ids.flow_of(sector): pos for pos, sector in enumerate(sectors)}
+    sector_cols = [sector.index for sector in sectors]
+    Y = numpy.zeros((len(sectors), len(demand_processes)))
+    for j, (_, process) in enumerate(demand_processes):
+        for exchange in process['exchanges'][:-1]:
+            Y[position_of[exchange['flow']['@id']], j] += exchange['amount']
+
+    # a single factorization of I - A for all demand vectors
+    X = numpy.linalg.solve(_technology_matrix(A, sectors), Y)
+    G = B.dense(sector_cols, len(flows)) @ X
+    H = _dense(C)[numpy.ix_(
+        [i.index for i in indicators], [f.index for f in flows])] @ G
+
+    for j, (demand, process) in enumerate(demand_processes):
+        ref_exchange = process['exchanges'][-1]
+        flow_results = [{
+            'flow': {'@type': 'Flow', '@id': ref_exchange['flow']['@id']},
+            'isInput': False,
+            'isRefFlow': True,
+            'amount': ref_exchange['amount'],
+        }]
+        for pos in numpy.nonzero(G[:, j])[0].tolist():
+            flow = flows[pos]
+            flow_results.append({
+                'flow': {'@type': 'Flow', '@id': flow.uid},
+                'isInput': _is_input_flow(flow),
+                'amount': float(G[pos, j]),
+            })
+        result = {
+            '@type': 'Result',
+            '@id': ids.get('result', demand.uid),
+            'name': demand.name,
+            'description': process['description'],
+            'version': MODEL_VERSION,
+            'impactMethod': {'@type': 'ImpactMethod',
+                             '@id': _RefIds.IMPACT_METHOD},
+            'flowResults': flow_results,
+            'impactResults': [{
+                'indicator': {'@type': 'ImpactCategory', '@id': indicator.uid},
+                'amount': float(H[i, j]),
+            } for i, indicator in enumerate(indicators)],
+        }
+        if with_systems:
+            result['productSystem'] = {
+                '@type': 'ProductSystem',
+                '@id': ids.get('product_system', demand.uid)}
+        _write_obj(zip_file, 'results', result)
 
 
 def _is_valid_useeio_folder(folder: str) -> bool:
+    for matrix in ('A', 'B', 'C'):
+        if _matrix_path(folder, matrix) is None:
+            log.error("required matrix '%s' (.bin, .npy, or .npz) is missing "
+                      "in '%s'", matrix, folder)
+            return False
     required_files = [
-        'A.bin',
-        'B.bin',
-        'C.bin',
         'flows.csv',
         'sectors.csv',
         'indicators.csv',
@@ -373,7 +1317,24 @@ def _read_matrix_shape(file_path: str) -> Tuple[int, int]:
         return rows, cols
 
 
-def _read_matrix(file_path: str) -> numpy.ndarray:
+def _matrix_path(folder: str, name: str) -> Optional[str]:
+    """Returns the path of the matrix file with the given name in the model
+       folder: `<name>.bin`, `<name>.npy`, or `<name>.npz`, in this order."""
+    for extension in ('.bin', '.npy', '.npz'):
+        path = os.path.join(folder, name + extension)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _read_matrix(file_path: str):
+    """Reads a matrix file, depending on its extension, as memory mapped
+       dense array (`.bin` and `.npy`) or as sparse CSC matrix (`.npz`)."""
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == '.npy':
+        return numpy.load(file_path, mmap_mode='c')
+    if extension == '.npz':
+        return _CscMatrix.load(file_path)
     shape = _read_matrix_shape(file_path)
     return numpy.memmap(
         file_path, mode='c', dtype='<f8', shape=shape, offset=8, order='F')
@@ -388,7 +1349,36 @@ def _uid(*xs: str) -> str:
     return str(uuid.uuid3(uuid.NAMESPACE_OID, '/'.join(path)))
 
 
-def _write_ref_data(zip_file: zipfile.ZipFile):
+# the serialized reference data; they are the same for every model and are
+# created once per process (or passed to the workers of a batch conversion)
+_REF_DATA: Optional[List[Tuple[str, str]]] = None
+
+
+class _EntryCollector:
+    """Collects the entries of objects instead of writing them to a package."""
+
+    def __init__(self):
+        self.entries: List[Tuple[str, str]] = []
+
+    def writestr(self, name: str, data: str):
+        self.entries.append((name, data))
+
+
+def _ref_data_entries() -> List[Tuple[str, str]]:
+    global _REF_DATA
+    if _REF_DATA is None:
+        collector = _EntryCollector()
+        _collect_ref_data(collector)
+        _REF_DATA = collector.entries
+    return _REF_DATA
+
+
+def _write_ref_data(zip_file: _PackageWriter):
+    for name, data in _ref_data_entries():
+        zip_file.writestr(name, data)
+
+
+def _collect_ref_data(zip_file: _EntryCollector):
     _write_obj(zip_file, 'locations', {
         "@type": "Location",
         "@id": _RefIds.LOCATION_US,
@@ -554,7 +1544,7 @@ def _write_ref_data(zip_file: zipfile.ZipFile):
         }
     })
 
-    for actor in actor_dict.values():
+    for actor in _actors().values():
         if actor['name'] is None:
             continue
         uid = actor['id']
@@ -569,18 +1559,18 @@ def _write_ref_data(zip_file: zipfile.ZipFile):
         })
 
 
-def _write_sources(zip_file: zipfile.ZipFile, sources: List[_Source]):
+def _write_sources(zip_file: _PackageWriter, sources: List[_Source]):
     for source in sources:
         _write_obj(zip_file, 'sources', source.json_obj())
 
-def _write_categories(zip_file: zipfile.ZipFile, model_type: str,
-                      paths: List[str]):
+def _write_categories(zip_file: _PackageWriter, model_type: str,
+                      paths: List[str], ids: _IdRegistry):
     handled: Dict[str, dict] = {}
 
     def w(segments: List[str]) -> Optional[dict]:
         if len(segments) == 0:
             return None
-        uid = _uid(model_type.lower(), *segments)
+        uid = ids.get(model_type.lower(), *segments)
         obj = handled.get(uid)
         if obj:
             return obj
@@ -605,11 +1595,12 @@ def _write_categories(zip_file: zipfile.ZipFile, model_type: str,
         w([segment.strip() for segment in p.split('/')])
 
 
-def _write_tech_flows(zip_file: zipfile.ZipFile, sectors: List[_Sector]):
+def _write_tech_flows(zip_file: _PackageWriter, sectors: List[_Sector],
+                      ids: _IdRegistry):
     for sector in sectors:
         obj = {
             '@type': 'Flow',
-            '@id': _uid('flow', sector.uid),
+            '@id': ids.flow_of(sector),
             'name': sector.name,
             'description': FLOW_STR,
             'version': MODEL_VERSION,
@@ -623,12 +1614,12 @@ def _write_tech_flows(zip_file: zipfile.ZipFile, sectors: List[_Sector]):
         if sector.category not in ('', '/'):
             cat = "Technosphere Flows/" + sector.category.rstrip('/')
             path = [p.strip() for p in cat.split('/')]
-            obj['category'] = {'@id': _uid('flow', *path)}
+            obj['category'] = {'@id': ids.get('flow', *path)}
         _write_obj(zip_file, 'flows', obj)
 
 
-def _write_envi_flows(zip_file: zipfile.ZipFile, flows: List[_Flow],
-                      flowType='ELEMENTARY_FLOW'):
+def _write_envi_flows(zip_file: _PackageWriter, flows: List[_Flow],
+                      ids: _IdRegistry, flowType='ELEMENTARY_FLOW'):
     for flow in flows:
         obj = {
             '@type': 'Flow',
@@ -647,23 +1638,26 @@ def _write_envi_flows(zip_file: zipfile.ZipFile, flows: List[_Flow],
             else:
                 context = flow.context
             path = [p.strip() for p in context.split('/')]
-            obj['category'] = {'@id': _uid('flow', *path)}
+            obj['category'] = {'@id': ids.get('flow', *path)}
         if flowType == 'WASTE_FLOW':
             obj['description'] = FLOW_STR
 
         _write_obj(zip_file, 'flows', obj)
 
 
-def _init_process(sector: _Sector, source_list: List[_Source]) -> dict:
+def _init_process(sector: _Sector, doc: dict, ids: _IdRegistry) -> dict:
+    """Creates the process of the given sector with its quantitative
+       reference. The process documentation `doc` is created once per
+       conversion and shared by all processes."""
 
     obj = {
         '@type': 'Process',
-        '@id': _uid('process', sector.uid),
+        '@id': ids.process_of(sector),
         'name': sector.name,
         'version': MODEL_VERSION,
-        'description': _conc_meta([sector.description, metadata['description']]),
+        'description': _conc_meta([sector.description, _metadata()['description']]),
         'processType': 'UNIT_PROCESS',
-        'processDocumentation': _process_doc(metadata, source_list),
+        'processDocumentation': doc,
         'lastInternalId': 1,
         'exchanges': [
             {
@@ -671,7 +1665,7 @@ def _init_process(sector: _Sector, source_list: List[_Source]) -> dict:
                 'input': False,
                 'amount': 1.0,
                 'quantitativeReference': True,
-                'flow': {'@id': _uid('flow', sector.uid)},
+                'flow': {'@id': ids.flow_of(sector)},
                 'unit': {'@id': _RefIds.UNIT_USD},
                 'flowProperty': {'@id': _RefIds.QUANTITY_USD},
             }
@@ -682,51 +1676,44 @@ def _init_process(sector: _Sector, source_list: List[_Source]) -> dict:
     if sector.category != '':
         cat = sector.category.rstrip('/')
         path = [p.strip() for p in cat.split('/')]
-        obj['category'] = {'@id': _uid('process', *path)}
+        obj['category'] = {'@id': ids.get('process', *path)}
     return obj
 
 
 def _create_tech_exchanges(sector: _Sector, sectors: List[_Sector],
-                           A: numpy.ndarray) -> List[dict]:
-    col = sector.index
-    exchanges = []
-    for other in sectors:
-        row = other.index
-        amount = A[row, col]
-        if amount == 0:
-            continue
-        exchanges.append({
+                           A: _SparseColumns, ids: _IdRegistry
+                           ) -> Iterator[dict]:
+    for pos, amount in zip(*A.column(sector.index)):
+        other = sectors[pos]
+        yield {
             'input': True,
             'amount': amount,
-            'flow': {'@id': _uid('flow', other.uid)},
+            'flow': {'@id': ids.flow_of(other)},
             'unit': {'@id': _RefIds.UNIT_USD},
             'flowProperty': {'@id': _RefIds.QUANTITY_USD},
-            'defaultProvider': {'@id': _uid('process', other.uid)}
-        })
-    return exchanges
+            'defaultProvider': {'@id': ids.process_of(other)}
+        }
 
 
 def _create_envi_exchanges(sector: _Sector, flows: List[_Flow],
-                           B: numpy.ndarray) -> List[dict]:
-    col = sector.index
-    exchanges = []
-    for flow in flows:
-        row = flow.index
-        amount = B[row, col]
-        if amount == 0:
-            continue
-        exchanges.append({
-            'input': flow.context.lower().strip().startswith('resource'),
+                           B: _SparseColumns) -> Iterator[dict]:
+    for pos, amount in zip(*B.column(sector.index)):
+        flow = flows[pos]
+        yield {
+            'input': _is_input_flow(flow),
             'amount': amount,
             'flow': {'@id': flow.uid},
             'unit': {'@id': _RefIds.of_unit(flow.unit)},
             'flowProperty': {'@id': _RefIds.of_quantity(flow.unit)}
-        })
-    return exchanges
+        }
+
+
+def _is_input_flow(flow: _Flow) -> bool:
+    return flow.context.lower().strip().startswith('resource')
 
 
-def _write_impacts(zip_file: zipfile.ZipFile, indicators: List[_Indicator],
-                   flows: List[_Flow], C: numpy.ndarray):
+def _write_impacts(zip_file: _PackageWriter, indicators: List[_Indicator],
+                   flows: List[_Flow], C, ids: _IdRegistry):
     # create the categories for the impacts
     categories: Dict[str, dict] = {}
     for indicator in indicators:
@@ -734,14 +1721,16 @@ def _write_impacts(zip_file: zipfile.ZipFile, indicators: List[_Indicator],
             continue
         obj = {
             '@type': 'Category',
-            '@id': _uid('impact_categoriy', indicator.group),
+            '@id': ids.get('impact_categoriy', indicator.group),
             'name': indicator.group,
             'modelType': 'IMPACT_CATEGORY',
         }
         categories[indicator.group] = obj
         _write_obj(zip_file, 'categories', obj)
 
-    # write the impact categories
+    # write the impact categories; the factors are taken from the columns of
+    # the transposed matrix C
+    C_cols = _SparseColumns.of(C.T, [f.index for f in flows])
     for indicator in indicators:
         obj = {
             '@type': 'ImpactCategory',
@@ -752,11 +1741,8 @@ def _write_impacts(zip_file: zipfile.ZipFile, indicators: List[_Indicator],
         }
 
         factors: List[dict] = []
-        row = indicator.index
-        for flow in flows:
-            value = C[row, flow.index]
-            if value == 0:
-                continue
+        for pos, value in zip(*C_cols.column(indicator.index)):
+            flow = flows[pos]
             factors.append({
                 'value': value,
                 'flow': {'@id': flow.uid},
@@ -781,16 +1767,38 @@ def _write_impacts(zip_file: zipfile.ZipFile, indicators: List[_Indicator],
     _write_obj(zip_file, 'lcia_methods', method)
 
 
-def _write_obj(zip_file: zipfile.ZipFile, path: str, obj: dict):
+def _content_hash(raw: bytes) -> str:
+    return hashlib.sha256(_CREATION_DATE.sub(b'', raw)).hexdigest()
+
+
+def _read_content_hashes(zip_path: str) -> Dict[str, str]:
+    """Reads the content hashes of the entries of a previous package."""
+    with zipfile.ZipFile(zip_path) as zip_file:
+        return {name: _content_hash(zip_file.read(name))
+                for name in zip_file.namelist()
+                if name != _DELETIONS_MANIFEST and not name.endswith('/')}
+
+
+def _write_obj(zip_file: _PackageWriter, path: str, obj: dict):
+    entry = _serialize_obj(path, obj)
+    if entry:
+        zip_file.writestr(*entry)
+
+
+def _serialize_obj(path: str, obj: dict) -> Optional[Tuple[str, str]]:
+    """Returns the entry name and JSON string of the given object in the
+       package or `None` if the object has no valid ID."""
     uid = obj.get('@id')
     obj["@context"] = "http://greendelta.github.io/olca-schema/"
     if uid is None or uid == '':
         log.error('invalid @id for object %s in %s', obj, path)
-        return
-    zip_file.writestr(f'{path}/{uid}.json', json.dumps(obj))
+        return None
+    return f'{path}/{uid}.json', json.dumps(obj)
 
 
 def _read_metadata(path=None):
+    import yaml
+
     if not path:
         path = os.path.dirname(__file__) + "/useeio_metadata.yml"
     with open(path) as f:
@@ -828,12 +1836,38 @@ def _conc_meta(m):
         return "\n\n".join(m)
 
 
+# the metadata are read on first use so that importing this module, e.g. for
+# its readers, does not parse the YAML files
+@functools.lru_cache(maxsize=None)
+def _model_yaml() -> dict:
+    return _read_metadata()
+
+
+@functools.lru_cache(maxsize=None)
+def _metadata() -> dict:
+    return _parse_metadata(_model_yaml())
+
+
+@functools.lru_cache(maxsize=None)
+def _demand_metadata() -> dict:
+    return _parse_metadata(_model_yaml(), 'demand_processes')
+
+
+@functools.lru_cache(maxsize=None)
+def _actors() -> dict:
+    return _read_metadata(os.path.dirname(__file__) + "/useeio_actors.yml")
+
+
 def _process_doc(m, source_list=None):
     source_ids = []
     if source_list:
-        source_ids = [{'@type': s.json_obj()['@type'],
-                       '@id': s.json_obj()['@id'],
-                       'name': s.json_obj()['name']} for s in source_list]
+        for source in source_list:
+            obj = source.json_obj()
+            source_ids.append({'@type': obj['@type'],
+                               '@id': obj['@id'],
+                               'name': obj['name']})
+    actors = _actors()
+    generator_id = _parse_metadata(actors, 'generator')['id']
 
     proc_dict = {'validFrom': datetime.datetime(TARGET_YEAR, 1, 1).isoformat(timespec='seconds'),
                  'validUntil': datetime.datetime(TARGET_YEAR, 12, 31).isoformat(timespec='seconds'),
@@ -842,9 +1876,9 @@ def _process_doc(m, source_list=None):
                  'technologyDescription': m['technology_descripton'],
 
                  'intendedApplication': m['intended_application'],
-                 'dataSetOwner': {'@id': _parse_metadata(actor_dict, 'owner')['id']},
-                 'dataGenerator': {'@id': _parse_metadata(actor_dict, 'generator')['id']},
-                 'dataDocumentor': {'@id': _parse_metadata(actor_dict, 'generator')['id']},
+                 'dataSetOwner': {'@id': _parse_metadata(actors, 'owner')['id']},
+                 'dataGenerator': {'@id': generator_id},
+                 'dataDocumentor': {'@id': generator_id},
                  'publication': {'@id': _Source(useeio_source).json_obj()['@id']},
                  'restrictionsDescription': m['access_restrictions'],
                  'projectDescription': m['project'],
@@ -930,26 +1964,111 @@ def generate_sources(bib_path, bibids):
     return source_list
 
 
-# define metadata for entire script
-model_yaml = _read_metadata()
-metadata = _parse_metadata(model_yaml)
-demand_metadata = _parse_metadata(model_yaml, 'demand_processes')
-actor_dict = _read_metadata(os.path.dirname(__file__) + "/useeio_actors.yml")
-
+def add_convert_arguments(parser: argparse.ArgumentParser, batch=False):
+    """Adds the options of `convert` to the command line parser. The options
+       that only make sense for a single model (`--jobs`, `--previous`,
+       `--cutoff-report`, `--library`) are left out for batch conversions."""
+    if not batch:
+        parser.add_argument('--jobs', type=int, default=1,
+                            help='the number of worker processes that create '
+                                 'the process documents; 0 uses all CPU cores')
+    parser.add_argument('--compression', default='deflate',
+                        choices=list(_COMPRESSION_METHODS.keys()),
+                        help='the compression method of the zip entries')
+    parser.add_argument('--level', type=int, default=None,
+                        help='the compression level; 0-9 for deflate, '
+                             '1-9 for bzip2')
+    parser.add_argument('--background-compression',
+                        action=argparse.BooleanOptionalAction, default=None,
+                        help='compress and write the package entries in a '
+                             'single background thread while the next '
+                             'objects are created (default for a single '
+                             'model) or on the main thread (default for '
+                             'batch conversions)')
+    if not batch:
+        parser.add_argument('--previous', default=None,
+                            help='a previous JSON-LD zip file of the model; '
+                                 'only new or changed objects and a manifest '
+                                 'of the deleted entries are written')
+        parser.add_argument('--library', action='store_true',
+                            help='write an openLCA library package with the '
+                                 'precomputed matrices of the model instead '
+                                 'of a JSON-LD package')
+    parser.add_argument('--cutoff', type=float, default=0.0,
+                        help='drop technosphere exchanges (A) with an '
+                             'absolute amount below this value in USD/USD')
+    parser.add_argument('--relative-cutoff', type=float, default=0.0,
+                        help='drop technosphere exchanges below this share '
+                             'of the absolute column total of A and '
+                             'elementary flow exchanges below this share of '
+                             'the absolute row total of their flow in B')
+    parser.add_argument('--digits', type=int, default=None,
+                        help='round exchange amounts to this number of '
+                             'significant digits')
+    if not batch:
+        parser.add_argument('--cutoff-report', default=None,
+                            help='the CSV file with the dropped amounts per '
+                                 'sector and unit; default: '
+                                 '<zip file>_cutoff.csv')
+    parser.add_argument('--stream', action='store_true',
+                        help='stream the exchanges of each process into the '
+                             'package instead of building the process '
+                             'document in memory')
+    parser.add_argument('--roots', nargs='+', default=None,
+                        help='export only these sectors (IDs or codes) and '
+                             'their upstream supply chain')
+    parser.add_argument('--no-product-systems', action='store_true',
+                        help='do not write the linked product systems of the '
+                             'demand vectors')
+    parser.add_argument('--results', action='store_true',
+                        help='solve the model for the demand vectors and '
+                             'write their inventory and impact results')
+    parser.add_argument('--system-processes', action='store_true',
+                        help='write an aggregated system process with the '
+                             'cradle-to-gate inventory of each sector')
+
+
+def convert_options(args: argparse.Namespace) -> dict:
+    """Returns the keyword arguments of `convert` for the options that were
+       added with `add_convert_arguments`."""
+    options = dict(
+        compression=_COMPRESSION_METHODS[args.compression],
+        level=args.level, background_compression=args.background_compression,
+        cutoff=args.cutoff, relative_cutoff=args.relative_cutoff,
+        digits=args.digits, stream=args.stream, roots=args.roots,
+        product_systems=not args.no_product_systems, results=args.results,
+        system_processes=args.system_processes)
+    for name, key in (('jobs', 'jobs'), ('previous', 'previous_zip'),
+                      ('cutoff_report', 'cutoff_report')):
+        if hasattr(args, name):
+            options[key] = getattr(args, name)
+    return options
+
+
+def _check_library_options(parser: argparse.ArgumentParser,
+                           args: argparse.Namespace):
+    """Exits with an error when options of the JSON-LD package were given
+       together with `--library`: the library package always contains the
+       full, uncut matrices of the model."""
+    ignored = ('folder', 'zip', 'bib', 'library')
+    given = ['--' + name.replace('_', '-') for name, value in vars(args).items()
+             if name not in ignored and value != parser.get_default(name)]
+    if given:
+        parser.error(f"{', '.join(given)} cannot be used with --library")
 
 
 if __name__ == '__main__':
-    args = sys.argv
-    if len(args) < 3:
-        print("""
-A simple USEEIO (matrix API export) to openLCA (JSON-LD) converter
-
-Usage:
-
-  $ python3 [USEEIO data folder] [openLCA JSON-LD zip file]
-""")
+    parser = argparse.ArgumentParser(
+        description='A simple USEEIO (matrix API export) to openLCA '
+                    '(JSON-LD) converter')
+    parser.add_argument('folder', help='the USEEIO data folder')
+    parser.add_argument('zip', help='the openLCA JSON-LD zip file')
+    parser.add_argument('bib', nargs='?', default=None,
+                        help='an optional BibTeX file with the model sources')
+    add_convert_arguments(parser)
+    args = parser.parse_args()
+    if args.library:
+        _check_library_options(parser, args)
+        convert_library(args.folder, args.zip, args.bib)
     else:
-        bib_path = None
-        if len(args) == 4:
-            bib_path = args[3]
-        convert(args[1], args[2], bib_path)
+        convert(args.folder, args.zip, args.bib, **convert_options(args))
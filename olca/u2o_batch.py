@@ -0,0 +1,168 @@
+"""Batch conversion of USEEIO models to openLCA
+
+Converts a list of USEEIO API model folders, or the models of a catalog, to
+JSON-LD packages in a pool of worker processes. The reference data (units,
+flow properties, location, and actors) and the model metadata are the same
+for all models; they are created once before the pool starts and shared with
+the workers. At the end, a timing report of the models is printed:
+
+```
+$ python3 u2o_batch.py [model folders ...] --out [output folder]
+$ python3 u2o_batch.py --catalog ../models.csv --root [API folder] \
+      --out [output folder] [--models kingbird USEEIOv2.5-kinglet-22]
+```
+
+The catalog is the model table `models.csv` of this repository, with the
+columns `Model` (e.g. `USEEIO v2.5-kinglet-22`) and `Alias` (e.g. `kinglet`),
+among others. The folder of a model is searched in the root folder under the
+model name without spaces (`USEEIOv2.5-kinglet-22`, the folder name of the
+useeior API output), the model name, and, if it is unique in the catalog, the
+alias. Models without a folder are skipped. The packages are named by the
+model name without spaces. With `--models`, only the models with the given
+names or aliases are converted.
+
+The options of `u2o.convert` (compression, cutoff, rounding, product
+systems, results, etc.) are passed to all conversions, so that the packages
+are the same as those of single conversions with `u2o.py`.
+"""
+
+import argparse
+import collections
+import csv
+import logging as log
+import multiprocessing
+import os
+import time
+
+from typing import List, Optional, Tuple
+
+import u2o
+
+
+def read_catalog(catalog_path: str, root: str,
+                 selection: Optional[List[str]] = None
+                 ) -> List[Tuple[str, str]]:
+    """Reads the models of the catalog (`models.csv`) and returns the
+       (package name, model folder) pairs of the models that have a folder in
+       the root folder. With a selection, only the models with these names
+       (with or without spaces) or aliases are returned."""
+    with open(catalog_path, 'r', encoding='utf-8') as f:
+        rows = [(
+            (row.get('Model') or '').strip(), (row.get('Alias') or '').strip())
+            for row in csv.DictReader(f)]
+    aliases = collections.Counter(alias for _, alias in rows)
+    models = []
+    for model, alias in rows:
+        if model == '':
+            continue
+        name = model.replace(' ', '')
+        if selection and not {model, name, alias} & set(selection):
+            continue
+        candidates = [name, model]
+        if alias != '' and aliases[alias] == 1:
+            candidates.append(alias)
+        folder = next((os.path.join(root, c) for c in candidates
+                       if os.path.isdir(os.path.join(root, c))), None)
+        if folder is None:
+            log.info('no model folder for %s in %s', model, root)
+            continue
+        models.append((name, folder))
+    return models
+
+
+def convert_all(models: List[Tuple[str, str]], out_dir: str,
+                bib_path: Optional[str] = None,
+                workers: Optional[int] = None, **kwargs) -> List[dict]:
+    """Converts the given (model name, model folder) pairs into packages
+       `<out_dir>/<model name>.zip` and returns the timing report. Further
+       keyword arguments are passed to `u2o.convert` (see
+       `u2o.convert_options`); the entries are compressed inline by default
+       because the models already run in parallel."""
+    os.makedirs(out_dir, exist_ok=True)
+    if kwargs.get('background_compression') is None:
+        kwargs['background_compression'] = False
+
+    # create the shared data once; forked workers inherit them and the
+    # initializer passes them to spawned workers
+    u2o._metadata()
+    u2o._demand_metadata()
+    ref_data = u2o._ref_data_entries()
+
+    tasks = [(name, folder, os.path.join(out_dir, f'{name}.zip'), bib_path,
+              kwargs) for name, folder in models]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(tasks)))
+    with multiprocessing.Pool(workers, initializer=_init_worker,
+                              initargs=(ref_data,)) as pool:
+        return pool.map(_convert, tasks, chunksize=1)
+
+
+def _init_worker(ref_data: List[Tuple[str, str]]):
+    u2o._REF_DATA = ref_data
+
+
+def _convert(task) -> dict:
+    name, folder, zip_path, bib_path, kwargs = task
+    report = {'model': name, 'zip': zip_path, 'seconds': 0.0, 'status': 'ok'}
+    if not u2o._is_valid_useeio_folder(folder):
+        report['status'] = 'invalid model folder'
+        return report
+    start = time.perf_counter()
+    try:
+        u2o.convert(folder, zip_path, bib_path, **kwargs)
+    except Exception as e:
+        log.exception('failed to convert model %s', name)
+        report['status'] = f'error: {e}'
+    report['seconds'] = time.perf_counter() - start
+    return report
+
+
+def print_report(reports: List[dict], total: float):
+    width = max([len('model')] + [len(r['model']) for r in reports])
+    print(f'{"model":<{width}}  {"time [s]":>9}  status')
+    for r in reports:
+        print(f'{r["model"]:<{width}}  {r["seconds"]:>9.1f}  {r["status"]}')
+    print(f'{"total":<{width}}  {total:>9.1f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Converts a batch of USEEIO models to openLCA (JSON-LD)')
+    parser.add_argument('folders', nargs='*', help='the model folders')
+    parser.add_argument('--catalog', default=None,
+                        help='the model catalog (models.csv) with the '
+                             'columns Model and Alias')
+    parser.add_argument('--root', default=None,
+                        help='the folder with the model folders of the '
+                             'catalog')
+    parser.add_argument('--models', nargs='+', default=None,
+                        help='convert only these models of the catalog '
+                             '(names or aliases)')
+    parser.add_argument('--out', required=True,
+                        help='the output folder of the packages')
+    parser.add_argument('--bib', default=None,
+                        help='an optional BibTeX file with the model sources')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='the number of models that are converted in '
+                             'parallel, default: all CPU cores')
+    u2o.add_convert_arguments(parser, batch=True)
+    args = parser.parse_args()
+
+    models = [(os.path.basename(os.path.normpath(folder)), folder)
+              for folder in args.folders]
+    if args.catalog:
+        if not args.root:
+            parser.error('--catalog requires the --root folder of the models')
+        catalog = read_catalog(args.catalog, args.root, args.models)
+        if len(catalog) == 0:
+            parser.error(f'no model folders of {args.catalog} found in '
+                         f'{args.root}')
+        models += catalog
+    if len(models) == 0:
+        parser.error('no model folders or catalog given')
+
+    start = time.perf_counter()
+    reports = convert_all(models, args.out, args.bib, args.workers,
+                          **u2o.convert_options(args))
+    print_report(reports, time.perf_counter() - start)